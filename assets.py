@@ -0,0 +1,174 @@
+#
+# Cursor images packed into one texture atlas, loaded as they are needed.
+#
+# The first run decodes the PNGs and writes their raw RGBA pixels and the
+# atlas layout to a cache file next to them, keyed by the names, sizes
+# and mtimes of the sources. Later runs create the empty atlas texture
+# from the cached layout and copy each image's pixels in from the cache
+# the first time it is asked for, so startup only reads what is shown and
+# no PNG is decoded at all. Every image is a region of the same texture,
+# so switching between them never changes the bound texture. Regions are
+# stored with a gutter of repeated edge texels around them, so a scaled
+# or rotated sprite, which is filtered linearly, never samples its
+# neighbours.
+#
+
+import os
+import math
+import json
+import struct
+
+import pyglet
+from pyglet.gl import *
+
+# bumped whenever the cache layout changes, so old caches are rebuilt
+magic = 'CAT2'
+
+# texels of repeated edge around every region
+gutter = 2
+
+def pad(data, width, height, border):
+    """RGBA rows of width x height, with their edge texels repeated
+    border times all the way round."""
+    rows = []
+    for y in range(height):
+        row = data[y * width * 4:(y + 1) * width * 4]
+        rows.append(row[:4] * border + row + row[-4:] * border)
+    return rows[0] * border + ''.join(rows) + rows[-1] * border
+
+class CursorAtlas:
+    def __init__(self, directory, files, cache='cursors.atlas'):
+        self.directory = directory
+        self.files = list(files)
+        self.cache = os.path.join(directory, cache)
+        # raw pixels we already have in memory, by name
+        self.pixels = {}
+        index = self.read_index()
+        if index is None:
+            index = self.build()
+        self.layout = index['layout']
+        self.data_start = index['data']
+        self.texture = pyglet.image.Texture.create(index['width'], index['height'], GL_RGBA)
+        self.regions = {}
+
+    def key(self):
+        key = []
+        for name in self.files:
+            stat = os.stat(os.path.join(self.directory, name))
+            key.append([name, stat.st_size, stat.st_mtime])
+        return key
+
+    def read_index(self):
+        # the cached layout, or None if there is none, it is stale or it
+        # is not a whole cache file
+        try:
+            cache = open(self.cache, 'rb')
+        except IOError:
+            return None
+        try:
+            if cache.read(4) != magic:
+                return None
+            length, = struct.unpack('<I', cache.read(4))
+            index = json.loads(cache.read(length))
+            if index['key'] != self.key():
+                return None
+            end = 8 + length + sum([(width + 2 * gutter) * (height + 2 * gutter) * 4
+                for x, y, width, height, offset in index['layout'].values()])
+            if os.fstat(cache.fileno()).st_size < end:
+                return None
+        except (struct.error, ValueError, KeyError, TypeError):
+            return None
+        finally:
+            cache.close()
+        index['data'] = 8 + length
+        return index
+
+    def build(self):
+        # decode everything once, shelf-pack it and write the cache; the
+        # layout has each image's own rectangle, the cache its padded pixels
+        images = [pyglet.image.load(os.path.join(self.directory, name)) for name in self.files]
+        width = max([img.width + 2 * gutter for img in images]) * int(math.ceil(math.sqrt(len(images))))
+        layout = {}
+        x = y = shelf = offset = 0
+        blocks = []
+        for name, img in zip(self.files, images):
+            slot_width, slot_height = img.width + 2 * gutter, img.height + 2 * gutter
+            if x + slot_width > width:
+                x, y, shelf = 0, y + shelf, 0
+            data = pad(img.get_image_data().get_data('RGBA', img.width * 4), img.width, img.height, gutter)
+            layout[name] = [x + gutter, y + gutter, img.width, img.height, offset]
+            self.pixels[name] = data
+            blocks.append(data)
+            offset += len(data)
+            x += slot_width
+            shelf = max(shelf, slot_height)
+        index = {'key': self.key(), 'width': width, 'height': y + shelf, 'layout': layout}
+
+        header = json.dumps(index)
+        # write it aside and move it into place, so a run that is cut
+        # short never leaves half a cache behind
+        temp = '%s.%d.tmp' % (self.cache, os.getpid())
+        try:
+            cache = open(temp, 'wb')
+            try:
+                cache.write(magic + struct.pack('<I', len(header)) + header)
+                for data in blocks:
+                    cache.write(data)
+            finally:
+                cache.close()
+            if os.name == 'nt' and os.path.exists(self.cache):
+                # windows will not rename over an existing file
+                os.remove(self.cache)
+            os.rename(temp, self.cache)
+        except (IOError, OSError):
+            # a read-only checkout just rebuilds every time
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+        index['data'] = 8 + len(header)
+        return index
+
+    def read_pixels(self, name):
+        data = self.pixels.pop(name, None)
+        if data is None:
+            x, y, width, height, offset = self.layout[name]
+            cache = open(self.cache, 'rb')
+            cache.seek(self.data_start + offset)
+            data = cache.read((width + 2 * gutter) * (height + 2 * gutter) * 4)
+            cache.close()
+        return data
+
+    def image(self, name):
+        """The centre-anchored atlas region for name, uploaded on first use."""
+        region = self.regions.get(name)
+        if region is None:
+            x, y, width, height, offset = self.layout[name]
+            data = self.read_pixels(name)
+            padded = pyglet.image.ImageData(width + 2 * gutter, height + 2 * gutter, 'RGBA', data)
+            self.texture.blit_into(padded, x - gutter, y - gutter, 0)
+            region = self.texture.get_region(x, y, width, height)
+            region.anchor_x = width // 2
+            region.anchor_y = height // 2
+            self.regions[name] = region
+        return region
+
+    def prefetch(self):
+        """Upload one image nobody asked for yet; False once all are in."""
+        for name in self.files:
+            if name not in self.regions:
+                self.image(name)
+                return True
+        return False
+
+# atlases already loaded, by directory and files
+atlases = {}
+
+def shared_atlas(directory, files, cache='cursors.atlas'):
+    """The one CursorAtlas of these files in this process; windows share
+    their GL objects, so its texture serves every window."""
+    key = (os.path.abspath(directory), tuple(files), cache)
+    atlas = atlases.get(key)
+    if atlas is None:
+        atlas = atlases[key] = CursorAtlas(directory, files, cache)
+    return atlas
@@ -0,0 +1,66 @@
+from pyglet.gl import *
+import pyglet
+
+class Framebuffer:
+    """An offscreen render target: a rectangle texture attached to an FBO."""
+    def __init__(self, width, height, internalformat=GL_RGBA):
+        self.width, self.height = width, height
+        # Setup Texture
+        texture = pyglet.image.Texture.create_for_size(GL_TEXTURE_RECTANGLE_ARB, width, height, internalformat=internalformat)
+        glTexParameteri(texture.target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(texture.target, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        self.texture = texture
+        # attach it to a new framebuffer object
+        handle = GLuint(0)
+        glGenFramebuffersEXT(1, byref(handle))
+        self.handle = handle
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, handle)
+        glFramebufferTexture2DEXT(GL_FRAMEBUFFER_EXT, GL_COLOR_ATTACHMENT0_EXT, texture.target, texture.id, 0)
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, 0)
+
+    def bind(self):
+        # render into the texture, with a pixel-sized orthographic projection;
+        # whatever was bound before is bound again by unbind, so targets nest
+        self.previous = self.binding()
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.handle)
+        glPushAttrib(GL_VIEWPORT_BIT)
+        glViewport(0, 0, self.width, self.height)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, self.width, 0, self.height, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+    def unbind(self):
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPopMatrix()
+        glPopAttrib()
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.previous)
+
+    def binding(self):
+        current = GLint(0)
+        glGetIntegerv(GL_FRAMEBUFFER_BINDING_EXT, byref(current))
+        return current.value
+
+    def clear(self, r=0.0, g=0.0, b=0.0, a=0.0):
+        # leave the window's clear colour alone
+        glPushAttrib(GL_COLOR_BUFFER_BIT)
+        glClearColor(r, g, b, a)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glPopAttrib()
+
+    def read(self, buffer, type=GL_UNSIGNED_BYTE):
+        """Read the RGBA contents into buffer, bottom row first."""
+        previous = self.binding()
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.handle)
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, type, buffer)
+        glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, previous)
+
+    def delete(self):
+        glDeleteFramebuffersEXT(1, byref(self.handle))
+        # pyglet frees the texture itself once it is unreferenced
+        self.texture = None
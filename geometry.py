@@ -0,0 +1,19 @@
+import pyglet
+from pyglet.gl import *
+
+# Windows made in one process share their GL objects, so every window
+# of a given size can draw the same quad from the same vertex buffer.
+quads = {}
+
+def quad(width, height, s=1.0, t=1.0):
+    """A batch holding a width x height quad, texcoords running to (s, t)."""
+    key = (width, height, s, t)
+    batch = quads.get(key)
+    if batch is None:
+        batch = pyglet.graphics.Batch()
+        batch.add(4, GL_QUADS, None, 
+            ('v2i', (0, 0, width, 0, width, height, 0, height)), 
+            ('t2f', (0, 0, s, 0.0, s, t, 0.0, t))
+        )
+        quads[key] = batch
+    return batch
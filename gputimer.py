@@ -0,0 +1,45 @@
+from ctypes import c_uint64
+
+from pyglet.gl import *
+
+class GpuTimer:
+    """GPU time of a span of GL calls, via a pair of GL_TIMESTAMP queries.
+
+    Two pairs are used in turn, so the result read back is the previous
+    span's and reading it never waits on the GPU. Unlike GL_TIME_ELAPSED
+    queries, timestamps can be taken inside another timer's span, so
+    timers nest. Queries belong to the context they were made in, so a
+    timer must stay with one context.
+    """
+    def __init__(self):
+        self.queries = None
+        self.issued = [False, False]
+        self.count = 0
+        # milliseconds of the last span whose result came back
+        self.elapsed = 0.0
+        # and all of them so far
+        self.total = 0.0
+
+    def begin(self):
+        if self.queries is None:
+            self.queries = (GLuint * 4)()
+            glGenQueries(4, self.queries)
+        current, previous = self.count % 2, (self.count + 1) % 2
+        if self.issued[previous]:
+            start, end = self.queries[2 * previous], self.queries[2 * previous + 1]
+            available = GLint(0)
+            # the end stamp comes back last
+            glGetQueryObjectiv(end, GL_QUERY_RESULT_AVAILABLE, byref(available))
+            if available.value:
+                begun, ended = c_uint64(0), c_uint64(0)
+                glGetQueryObjectui64vEXT(start, GL_QUERY_RESULT, byref(begun))
+                glGetQueryObjectui64vEXT(end, GL_QUERY_RESULT, byref(ended))
+                self.elapsed = (ended.value - begun.value) / 1e6
+                self.total += self.elapsed
+                self.issued[previous] = False
+        glQueryCounter(self.queries[2 * current], GL_TIMESTAMP)
+        self.issued[current] = True
+
+    def end(self):
+        glQueryCounter(self.queries[2 * (self.count % 2) + 1], GL_TIMESTAMP)
+        self.count += 1
@@ -0,0 +1,157 @@
+#
+# Run several demos in one process and one event loop.
+#
+#   python host.py template randomshader turntable mandelbrot:60:0:1
+#
+# Each argument is a demo module, optionally followed by its frame rate
+# when focused, its frame rate in the background (0 pauses it) and its
+# priority. Options starting with -- are left to the demos, which read
+# them from sys.argv. pyglet windows made in one process share their GL
+# objects, so every program is compiled once and the fullscreen quads
+# and the cursor atlas (assets.shared_atlas) exist once, whichever
+# window uses them.
+#
+# The loop redraws a demo when its frame is due, focused window first,
+# then by priority. Once the draws of one pass through the loop have
+# used up the frame budget, background demos that are still due wait
+# for the next pass. Every few seconds it prints each demo's frame rate
+# and its share of the CPU and GPU time spent drawing.
+#
+
+import sys
+import time
+
+import pyglet
+
+from gputimer import GpuTimer
+
+class Demo:
+    def __init__(self, name, window, fps, background_fps, priority):
+        self.name = name
+        self.window = window
+        self.fps = fps
+        self.background_fps = background_fps
+        self.priority = priority
+        self.focused = False
+        self.next = 0.0
+        # stats since the last report
+        self.frames = 0
+        self.cpu = 0.0
+        self.timer = GpuTimer()
+        self.gpu = 0.0
+
+    def on_activate(self):
+        self.focused = True
+        # draw promptly when brought to the front
+        self.next = 0.0
+
+    def on_deactivate(self):
+        self.focused = False
+
+    def interval(self):
+        fps = self.fps if self.focused else self.background_fps
+        if not fps:
+            return None
+        return 1.0 / fps
+
+    def due(self, now):
+        return self.interval() is not None and now >= self.next
+
+    def draw(self, now):
+        window = self.window
+        window.switch_to()
+        start = time.time()
+        # process cpu time (on windows time.clock is wall time too), so
+        # driver stalls such as a blocking readback do not count as cpu
+        start_cpu = time.clock()
+        self.timer.begin()
+        window.dispatch_event('on_draw')
+        self.timer.end()
+        window.flip()
+        self.cpu += time.clock() - start_cpu
+        elapsed = time.time() - start
+        self.gpu = self.timer.total
+        self.frames += 1
+        # schedule from the slot we were due in, but never catch up in a burst
+        self.next = max(self.next + self.interval(), now)
+        return elapsed
+
+class DemoHost:
+    def __init__(self, budget=1.0/60.0, report_interval=5.0):
+        # seconds of drawing one pass through the loop may take
+        self.budget = budget
+        self.report_interval = report_interval
+        self.demos = []
+
+    def add(self, name, fps=60.0, background_fps=10.0, priority=0):
+        module = __import__(name)
+        window = module.ShaderWindow(module.shader)
+        # the host paces the frames, waiting for vsync in every window would
+        # serialise them
+        window.set_vsync(False)
+        demo = Demo(name, window, fps, background_fps, priority)
+        window.push_handlers(demo)
+        self.demos.append(demo)
+        return demo
+
+    def report(self, seconds):
+        cpu = sum([d.cpu for d in self.demos]) or 1.0
+        gpu = sum([d.gpu for d in self.demos]) or 1.0
+        lines = []
+        for d in self.demos:
+            lines.append('%-14s %6.1f fps  cpu %5.1f%%  gpu %5.1f%%%s' % (d.name,
+                d.frames / seconds, 100.0 * d.cpu / cpu, 100.0 * d.gpu / gpu,
+                '  focused' if d.focused else ''))
+        return '\n'.join(lines)
+
+    def reset_stats(self):
+        for d in self.demos:
+            d.frames = 0
+            d.cpu = 0.0
+            d.timer.total = 0.0
+            d.gpu = 0.0
+
+    def run(self):
+        last_report = time.time()
+        while self.demos:
+            # scheduled updates of every demo, then their window events
+            pyglet.clock.tick()
+            for demo in self.demos:
+                demo.window.dispatch_events()
+            for demo in [d for d in self.demos if d.window.has_exit]:
+                demo.window.close()
+                self.demos.remove(demo)
+
+            now = time.time()
+            due = [d for d in self.demos if d.due(now)]
+            due.sort(key=lambda d: (not d.focused, -d.priority))
+            spent = 0.0
+            for demo in due:
+                if spent >= self.budget and not demo.focused:
+                    break
+                spent += demo.draw(now)
+
+            if self.report_interval and now - last_report >= self.report_interval:
+                print self.report(now - last_report)
+                self.reset_stats()
+                last_report = now
+
+            # sleep until the next frame is due, but keep events flowing
+            waits = [d.next for d in self.demos if d.interval() is not None]
+            if waits:
+                time.sleep(max(0.0, min(min(waits) - time.time(), 0.01)))
+            else:
+                time.sleep(0.01)
+
+def parse(arg):
+    parts = arg.split(':')
+    values = [float(part) for part in parts[1:]]
+    return [parts[0]] + values
+
+if "__main__" == __name__:
+    host = DemoHost()
+    # options such as --profile are read by the demos themselves
+    for arg in sys.argv[1:]:
+        if not arg.startswith('--'):
+            host.add(*parse(arg))
+    host.run()
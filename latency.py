@@ -0,0 +1,108 @@
+#
+# Input-to-display latency for the interactive demos.
+#
+# Every input event of interest is timestamped as pyglet dispatches it.
+# The next frame the window flips is the first one that can reflect it,
+# so just before that flip a GL_TIMESTAMP query and a fence are put into
+# the GL command stream and the waiting events are tagged with them. The
+# query records the GPU clock when the frame's work is done, and the
+# offset between the GPU clock and time.time(), taken as the query is
+# issued, turns that into wall time. Fences are checked without
+# blocking at every flip after that; once one has signalled, its query
+# result is ready and each of its events gets an exact latency sample,
+# however late the check came: from the event to the frame's GPU work
+# completing. Scanout comes after that, so the real figure is higher by
+# up to a refresh.
+#
+
+import sys
+import time
+
+from ctypes import c_int64, c_uint64
+
+from pyglet.gl import *
+
+def percentile(samples, p):
+    # nearest rank, on a sorted list
+    index = int(round(p / 100.0 * (len(samples) - 1)))
+    return samples[index]
+
+class LatencyTracker:
+    """Latency samples per interaction type for one window.
+
+    kinds maps pyglet event names to interaction types, for example
+    {'on_mouse_scroll': 'zoom'}.
+    """
+    def __init__(self, window, kinds, report_on_close=True):
+        self.window = window
+        self.kinds = kinds
+        self.report_on_close = report_on_close
+        # events waiting for a frame, and frames waiting for the gpu
+        self.pending = []
+        self.fences = []
+        self.samples = dict([(kind, []) for kind in set(kinds.values())])
+        for name, kind in kinds.items():
+            setattr(self, name, self.stamper(kind))
+        window.push_handlers(self)
+        # hook the flip, which follows every draw however the window is driven
+        self.flip = window.flip
+        window.flip = self.on_flip
+
+    def stamper(self, kind):
+        def stamp(*args):
+            self.pending.append((kind, time.time()))
+        return stamp
+
+    def on_flip(self):
+        if self.pending:
+            query = GLuint(0)
+            glGenQueries(1, byref(query))
+            glQueryCounter(query, GL_TIMESTAMP)
+            fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            self.fences.append((fence, query, self.offset(), self.pending))
+            self.pending = []
+        self.flip()
+        self.poll()
+
+    def offset(self):
+        # seconds to add to a GPU timestamp to get time.time()
+        now = c_int64(0)
+        glGetInteger64v(GL_TIMESTAMP, byref(now))
+        return time.time() - now.value / 1e9
+
+    def poll(self):
+        # fences signal in order, so stop at the first one still busy
+        while self.fences:
+            fence, query, offset, events = self.fences[0]
+            result = glClientWaitSync(fence, 0, 0)
+            if result not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            glDeleteSync(fence)
+            del self.fences[0]
+            # the frame is done, so its timestamp is in and reading it
+            # does not wait
+            gpu = c_uint64(0)
+            glGetQueryObjectui64vEXT(query, GL_QUERY_RESULT, byref(gpu))
+            glDeleteQueries(1, byref(query))
+            done = gpu.value / 1e9 + offset
+            for kind, stamp in events:
+                self.samples[kind].append(done - stamp)
+
+    def stats(self):
+        """{kind: (count, p50, p95, p99)}, latencies in milliseconds."""
+        stats = {}
+        for kind, samples in self.samples.items():
+            if samples:
+                samples = sorted(samples)
+                stats[kind] = (len(samples),) + tuple([percentile(samples, p) * 1000.0 for p in (50, 95, 99)])
+        return stats
+
+    def report(self):
+        lines = []
+        for kind, (count, p50, p95, p99) in sorted(self.stats().items()):
+            lines.append('%-10s %6d events  p50 %6.1fms  p95 %6.1fms  p99 %6.1fms' % (kind, count, p50, p95, p99))
+        return '\n'.join(lines)
+
+    def on_close(self):
+        if self.report_on_close:
+            sys.stderr.write(self.report() + '\n')
@@ -1,3 +1,6 @@
+import startup
+
+import sys
 import math
 from math import pi
 
@@ -5,7 +8,10 @@ import pyglet
 from pyglet.window import key
 from pyglet.gl import *
 
+import geometry
 from shader import Shader as NewShader
+from latency import LatencyTracker
+from mandelprofile import IterationProfile
 import random
 
 class ShaderWindow(pyglet.window.Window):
@@ -16,6 +22,7 @@ class ShaderWindow(pyglet.window.Window):
     def __init__(self, shader):
         # Create window
         super(ShaderWindow, self).__init__(800, 800, caption="Shader Testing")
+        startup.mark('context creation')
         # Setup mouse
 
         shader.bind()
@@ -28,7 +35,10 @@ class ShaderWindow(pyglet.window.Window):
         shader.uniformf('InnerColor', 0.0, 0.0, 0.0)
         shader.uniformf('OuterColor2', 1, 1, 1)
         shader.uniformf('OuterColor1', 1.0, 1.0, 1.0)
+        shader.uniformf('JuliaC', 0.0, 0.0)
+        shader.uniformf('Julia', 0.0)
         shader.unbind()
+        startup.mark('shader compile')
         self.shader = shader
         self.center = [0, 0]
         self.zoom = 1.0
@@ -56,13 +66,8 @@ class ShaderWindow(pyglet.window.Window):
         glTexParameteri(texture.target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
         glTexParameteri(texture.target, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
         self.texture = texture
-        # Create batch and quad
-        batch = pyglet.graphics.Batch()
-        batch.add(4, GL_QUADS, None, 
-            ('v2i', (0, 0, self.width, 0, self.width, self.height, 0, self.height)), 
-            ('t2f', (0, 0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0))
-        )
-        self.batch = batch
+        # Fullscreen quad, shared by windows of the same size
+        self.batch = geometry.quad(self.width, self.height)
         
         self.setup_gl()
         
@@ -70,6 +75,14 @@ class ShaderWindow(pyglet.window.Window):
         self.push_handlers(self.keys)
         # set update function
         pyglet.clock.schedule_interval(self.update, 1.0/30.0)
+        # input to display latency, reported on close
+        if '--latency' in sys.argv:
+            self.latency = LatencyTracker(self, {'on_mouse_scroll': 'zoom',
+                'on_mouse_press': 'recenter', 'on_mouse_motion': 'colour'})
+        # iteration profiling: P toggles it, H the heatmap overlay
+        self.profile = None
+        if '--profile' in sys.argv:
+            self.toggle_profile()
         
 
 
@@ -109,6 +122,8 @@ class ShaderWindow(pyglet.window.Window):
     
         # copy the framebuffer, which also resizes the texture
         self.copyFramebuffer(self.texture, width, height)
+        if self.profile:
+            self.profile.resize(width, height)
         return pyglet.event.EVENT_HANDLED
         
     def on_mouse_motion(self, x, y, dx, dy):
@@ -138,8 +153,35 @@ class ShaderWindow(pyglet.window.Window):
         self.zoom *= 0.92
         
     def on_key_press(self, symbol, modifiers):
-        if symbol == pyglet.window.key.ESCAPE:
-            self.on_close()
+        if symbol == pyglet.window.key.P:
+            self.toggle_profile()
+        elif symbol == pyglet.window.key.H:
+            if not self.profile:
+                self.toggle_profile()
+            self.profile.toggle_overlay()
+            self.dodraw = 2
+        elif symbol == pyglet.window.key.ESCAPE:
+            # through the handler stack, so the latency report sees it
+            self.dispatch_event('on_close')
+            
+    def toggle_profile(self):
+        if self.profile:
+            self.profile.delete()
+            self.profile = None
+        else:
+            self.profile = IterationProfile(self, [vertex_source], [uniforms_source, iterate_source], trace=sys.stderr)
+        self.dodraw = 2
+        
+    def iterations(self):
+        iters = self.max_iters * (1.0 - (self.zoom ** .02))
+        return 400.0 if not self.quality_time else max(self.min_iters, iters)
+        
+    def set_view(self, program):
+        # the view uniforms, shared with the profiling shader
+        program.uniformf('Xcenter', self.center[0])
+        program.uniformf('Ycenter', self.center[1])
+        program.uniformf('Zoom', self.zoom)
+        program.uniformf('MaxIterations', self.iterations())
             
   
     def update(self, dt):
@@ -173,17 +215,14 @@ class ShaderWindow(pyglet.window.Window):
         
             
             self.shader.bind()
-            shader.uniformf('Xcenter', self.center[0])
-            shader.uniformf('Ycenter', self.center[1])
-            shader.uniformf('Zoom', self.zoom)
-            iters = self.max_iters * (1.0 - (self.zoom ** .02))
-            iters = 400.0 if not self.quality_time else max(self.min_iters, iters)
-            #print self.zoom, iters
-            shader.uniformf('MaxIterations', iters)
-            shader.uniformf('OuterColor1', *self.color)
+            self.set_view(self.shader)
+            self.shader.uniformf('OuterColor1', *self.color)
             self.batch.draw()
             self.shader.unbind()
             
+            if self.profile:
+                self.profile.profile()
+            
     
             #glBindTexture(self.texture.target, 0)
             #glBindTexture(texture1.target, 0)
@@ -192,9 +231,13 @@ class ShaderWindow(pyglet.window.Window):
             
             # copy the result back into the texture
         self.copyFramebuffer(self.texture)
+        startup.first_frame()
 
-# create our shader
-shader = NewShader(['''
+# the vertex shader, the uniforms and the iteration loop are shared with
+# the profiling shader in mandelprofile.py, and the iteration loop and the
+# colouring with the batched thumbnails in thumbnails.py, which reads the
+# same parameters from a texture instead of from uniforms
+vertex_source = '''
 varying vec3  Position;
 
 void main()
@@ -202,9 +245,9 @@ void main()
     Position        = vec3(gl_MultiTexCoord0 - 0.5) * 5.0;
     gl_Position     = ftransform();
 }
-'''], ['''
-varying vec3  Position;
+'''
 
+uniforms_source = '''
 uniform float MaxIterations;
 uniform float Zoom;
 uniform float Xcenter;
@@ -212,15 +255,26 @@ uniform float Ycenter;
 uniform vec3  InnerColor;
 uniform vec3  OuterColor1;
 uniform vec3  OuterColor2;
+uniform vec2  JuliaC;
+uniform float Julia;
+'''
 
-void main()
+iterate_source = '''
+varying vec3  Position;
+
+// why the loop stopped
+const float ExitMaxIterations = 0.0;
+const float ExitEscaped       = 1.0;
+
+float iterate(out float r2, out float reason)
 {
     float   real  = Position.x * Zoom + Xcenter;
     float   imag  = Position.y * Zoom + Ycenter;
-    float   Creal = real;   // Change this line. . .
-    float   Cimag = imag;   // . . .and this one to get a Julia set
+    // Julia = 1.0 iterates from every point with the constant JuliaC
+    float   Creal = mix(real, JuliaC.x, Julia);
+    float   Cimag = mix(imag, JuliaC.y, Julia);
 
-    float r2 = 0.0;
+    r2 = 0.0;
     float iter;
 
     for (iter = 0.0; iter < MaxIterations && r2 < 4.0; ++iter)
@@ -232,18 +286,34 @@ void main()
         r2   = (real * real) + (imag * imag);
     }
 
-    // Base the color on the number of iterations
-
-    vec3 color;
+    reason = r2 < 4.0 ? ExitMaxIterations : ExitEscaped;
+    return iter;
+}
+'''
 
+color_source = '''
+vec3 colorize(float iter, float r2)
+{
+    // Base the color on the number of iterations
     if (r2 < 4.0)
-        color = InnerColor;
+        return InnerColor;
     else
-        color = mix(OuterColor1, OuterColor2, fract(iter * 0.05));
+        return mix(OuterColor1, OuterColor2, fract(iter * 0.05));
+}
+'''
+
+# create our shader
+shader = NewShader([vertex_source], [uniforms_source, iterate_source, color_source, '''
+void main()
+{
+    float r2;
+    float reason;
+    float iter = iterate(r2, reason);
 
-    gl_FragColor = vec4(color, 1.0);
+    gl_FragColor = vec4(colorize(iter, r2), 1.0);
 }
 '''])
+startup.mark('import')
 
 
 def run():
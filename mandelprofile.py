@@ -0,0 +1,224 @@
+#
+# Iteration profiling for the Mandelbrot shader.
+#
+# A twin of the shader, built from the same iteration source, writes
+# each pixel's iteration count, loop exit reason and whether it is
+# interior into a float render target. A reduction pass sums that into
+# one texel per 16x16 tile - iterations, interior iterations, interior
+# pixels, pixels - and only that small target is read back, to work out
+# the iterations spent per frame, the share spent on interior pixels and
+# the worst tiles. The counts can also be drawn over the frame as a
+# heatmap.
+#
+
+import math
+
+from pyglet.gl import *
+
+from shader import Shader
+from rendergraph import RenderGraph, quad
+
+tile_size = 16
+
+def tiles_size(width, height):
+    # tiles across and up, the last ones partly outside the frame
+    return int(math.ceil(width / float(tile_size))), int(math.ceil(height / float(tile_size)))
+
+# the programs are shared by every profile and compiled on first use, so
+# turning profiling on and off again does not build new ones
+iterations_programs = {}
+
+def iterations_program(vert, iterate):
+    """The stats program for a window shader's sources, built once."""
+    key = (tuple(vert), tuple(iterate))
+    program = iterations_programs.get(key)
+    if program is None:
+        program = iterations_programs[key] = Shader(vert, iterate + ['''
+void main()
+{
+    float r2;
+    float reason;
+    float iter = iterate(r2, reason);
+
+    gl_FragColor = vec4(iter, reason, r2 < 4.0 ? 1.0 : 0.0, 1.0);
+}
+'''])
+    return program
+
+tiles_program = Shader(['''
+void main()
+{
+    gl_Position = ftransform();
+    gl_TexCoord[0] = gl_MultiTexCoord0;
+}
+'''], ['''
+uniform sampler2DRect Stats;
+uniform vec2 Size;
+uniform float TileSize;
+
+void main()
+{
+    vec2 base = floor(gl_TexCoord[0].xy) * TileSize;
+    vec4 sum = vec4(0.0);
+
+    for (float y = 0.0; y < TileSize; ++y)
+    {
+        for (float x = 0.0; x < TileSize; ++x)
+        {
+            vec2 p = base + vec2(x, y) + 0.5;
+            if (p.x < Size.x && p.y < Size.y)
+            {
+                vec4 s = texture2DRect(Stats, p);
+                sum += vec4(s.x, s.x * s.z, s.z, 1.0);
+            }
+        }
+    }
+
+    gl_FragColor = sum;
+}
+'''])
+
+heatmap_program = Shader(['''
+void main()
+{
+    gl_Position = ftransform();
+    gl_TexCoord[0] = gl_MultiTexCoord0;
+}
+'''], ['''
+uniform sampler2DRect Stats;
+uniform float MaxIterations;
+
+void main()
+{
+    vec4 s = texture2DRect(Stats, gl_TexCoord[0].xy);
+    float t = clamp(s.x / MaxIterations, 0.0, 1.0);
+
+    // blue through green to red as the cost goes up, interior in magenta
+    vec3 color = t < 0.5 ? mix(vec3(0.0, 0.0, 1.0), vec3(0.0, 1.0, 0.0), t * 2.0)
+                         : mix(vec3(0.0, 1.0, 0.0), vec3(1.0, 0.0, 0.0), t * 2.0 - 1.0);
+    if (s.z > 0.5)
+        color = vec3(1.0, 0.0, 1.0);
+
+    gl_FragColor = vec4(color, 0.6);
+}
+'''])
+
+class IterationProfile:
+    """Per-pixel cost of a mandelbrot.py window, one frame at a time.
+
+    vert and iterate are the window shader's vertex source and the
+    source defining its iterate() function, so both programs do the
+    same work. trace, if given, gets one line of stats per frame.
+    """
+    def __init__(self, window, vert, iterate, trace=None, overlay=False):
+        self.window = window
+        self.trace = trace
+        self.overlay = overlay
+        self.frame = 0
+        # stats of the last profiled frame
+        self.last = None
+
+        self.iterations = iterations_program(vert, iterate)
+        self.tiles = tiles_program
+        self.heatmap = heatmap_program
+
+        self.width, self.height = window.width, window.height
+        graph = RenderGraph(self.width, self.height, timing=False)
+        graph.add_pass('iterations', self.draw_iterations, output='stats', format=GL_RGBA32F_ARB)
+        graph.add_pass('tiles', self.draw_tiles, ['stats'], 'tiles', size=tiles_size, format=GL_RGBA32F_ARB)
+        graph.keep('tiles')
+        self.graph = graph
+        if overlay:
+            self.add_overlay()
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        self.graph.resize(width, height)
+
+    def add_overlay(self):
+        self.graph.add_pass('heatmap', self.draw_heatmap, ['stats'])
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.add_overlay()
+        else:
+            self.graph.remove_pass('heatmap')
+
+    def delete(self):
+        """Free the render targets; the profile is not used after this.
+        The programs are shared and stay compiled for the next profile."""
+        self.graph.delete()
+
+    def draw_iterations(self, graph, p, width, height):
+        # the stats are written as they are, not blended with the window's
+        # alpha blending over the last frame's
+        glPushAttrib(GL_COLOR_BUFFER_BIT)
+        glDisable(GL_BLEND)
+        program = self.iterations
+        program.bind()
+        self.window.set_view(program)
+        self.window.batch.draw()
+        program.unbind()
+        glPopAttrib()
+
+    def draw_tiles(self, graph, p, width, height):
+        # as for the stats: the pixel count in alpha must not blend
+        glPushAttrib(GL_COLOR_BUFFER_BIT)
+        glDisable(GL_BLEND)
+        program = self.tiles
+        program.bind()
+        program.uniformi('Stats', 0)
+        program.uniformf('Size', self.width, self.height)
+        program.uniformf('TileSize', tile_size)
+        quad(width, height)
+        program.unbind()
+        glPopAttrib()
+
+    def draw_heatmap(self, graph, p, width, height):
+        program = self.heatmap
+        program.bind()
+        program.uniformi('Stats', 0)
+        program.uniformf('MaxIterations', self.window.iterations())
+        quad(width, height)
+        program.unbind()
+
+    def profile(self):
+        """Run the profiling passes for the frame just drawn and return its stats."""
+        self.graph.execute()
+        target = self.graph.targets['tiles']
+        width, height = target.width, target.height
+        data = (c_float * (width * height * 4))()
+        target.read(data, GL_FLOAT)
+
+        total = interior = pixels = interior_pixels = 0.0
+        tiles = []
+        for i in range(width * height):
+            iters, inside, inside_pixels, count = data[i * 4:i * 4 + 4]
+            total += iters
+            interior += inside
+            interior_pixels += inside_pixels
+            pixels += count
+            tiles.append((iters, i % width, i // width))
+        tiles.sort(reverse=True)
+
+        self.last = {
+            'frame': self.frame,
+            'max iterations': self.window.iterations(),
+            'iterations': int(total),
+            'per pixel': total / max(pixels, 1.0),
+            'interior share': interior / max(total, 1.0),
+            'interior pixels': int(interior_pixels),
+            # (iterations, tile x, tile y), tiles counted from the bottom left
+            'worst tiles': [(int(iters), x, y) for iters, x, y in tiles[:5]],
+        }
+        if self.trace is not None:
+            self.trace.write(self.format(self.last) + '\n')
+        self.frame += 1
+        return self.last
+
+    def format(self, stats):
+        worst = ' '.join(['%d,%d:%d' % (x, y, iters) for iters, x, y in stats['worst tiles']])
+        return 'frame %d  max %.0f  iterations %d  per pixel %.1f  interior %.1f%%  worst %s' % (
+            stats['frame'], stats['max iterations'], stats['iterations'], stats['per pixel'],
+            100.0 * stats['interior share'], worst)
@@ -0,0 +1,110 @@
+#
+# Frame pacing for the demo windows.
+#
+# Simulation state advances in fixed steps through FixedStep, fed by the
+# real frame dt, and drawing interpolates between the last two steps with
+# FixedStep.alpha. Animation speed then no longer depends on how often
+# the scheduler gets round to us. FrameTimes measures frame-time jitter
+# and Metrics is a rate-limited channel for diagnostics, so nothing is
+# printed from the hot loop.
+#
+
+import sys
+import math
+import time
+
+import pyglet
+
+class FixedStep:
+    """Run step(dt) at a fixed rate, however the frame dts fall."""
+    def __init__(self, step, rate=60.0, max_steps=8):
+        self.step = step
+        self.dt = 1.0 / rate
+        # steps per advance before we give up catching up
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        # how far we are between the last step and the next, 0-1
+        self.alpha = 0.0
+        self.steps = 0
+        self.dropped = 0.0
+
+    def advance(self, dt):
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.dt:
+            if steps == self.max_steps:
+                # too far behind, slow the simulation down rather than
+                # spiral into ever longer frames
+                self.dropped += self.accumulator - self.accumulator % self.dt
+                self.accumulator %= self.dt
+                break
+            self.step(self.dt)
+            self.accumulator -= self.dt
+            steps += 1
+        self.steps += steps
+        self.alpha = self.accumulator / self.dt
+        return steps
+
+def schedule(window, update, rate=60.0, vsync=True):
+    """Call update(dt) once per frame: with vsync the display sets the
+    pace, without it we ask for rate frames a second."""
+    window.set_vsync(vsync)
+    if vsync:
+        pyglet.clock.schedule(update)
+    else:
+        pyglet.clock.schedule_interval(update, 1.0 / rate)
+
+class FrameTimes:
+    """The last few intervals between frames, for jitter measurements."""
+    def __init__(self, size=240):
+        self.size = size
+        self.intervals = []
+        self.last = None
+
+    def tick(self):
+        now = time.time()
+        if self.last is not None:
+            self.intervals.append(now - self.last)
+            if len(self.intervals) > self.size:
+                del self.intervals[0]
+        self.last = now
+
+    def stats(self):
+        """Mean, standard deviation and worst frame time, in milliseconds."""
+        if not self.intervals:
+            return 0.0, 0.0, 0.0
+        n = float(len(self.intervals))
+        mean = sum(self.intervals) / n
+        deviation = math.sqrt(sum([(i - mean) ** 2 for i in self.intervals]) / n)
+        return mean * 1000.0, deviation * 1000.0, max(self.intervals) * 1000.0
+
+class Metrics:
+    """Diagnostics channel: values are kept as they are set and written
+    out together at most once per interval."""
+    def __init__(self, interval=1.0, stream=None, enabled=True):
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.enabled = enabled
+        self.values = {}
+        self.last = time.time()
+
+    def value(self, name, value):
+        if not self.enabled:
+            return
+        self.values[name] = value
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.flush()
+            self.last = now
+
+    def flush(self):
+        items = sorted(self.values.items())
+        self.stream.write('  '.join(['%s=%s' % (name, format_value(value)) for name, value in items]) + '\n')
+        self.values = {}
+
+def format_value(value):
+    if isinstance(value, float):
+        return '%.4g' % value
+    if isinstance(value, tuple):
+        return '/'.join([format_value(v) for v in value])
+    return str(value)
@@ -1,33 +1,41 @@
-from random import random
+import startup
+
+from random import randint
 
 import pyglet
 from pyglet.window import key
 from pyglet.gl import *
 
+import geometry
 from shader import Shader
+import rng
 
 class ShaderWindow(pyglet.window.Window):
-    def __init__(self, shader):
+    def __init__(self, shader, seed=None):
         # Create window
         super(ShaderWindow, self).__init__(640, 640, caption="Shader Testing")
+        startup.mark('context creation')
+        # Noise is keyed by (pixel, frame, seed), so a run can be replayed
+        # on the CPU with rng.rng(width, height, frame, seed)
+        if seed is None:
+            seed = randint(0, 2**31 - 1)
+        self.seed = seed
+        self.frame = 0
         # Shader constants
         shader.bind()
         shader.uniformi('tex0', 0)
         shader.uniformf('pixel', 1.0/self.width, 1.0/self.height)
+        shader.uniformi('seed', self.seed)
         shader.unbind()
+        startup.mark('shader compile')
         self.shader = shader
         # Setup Texture
         texture = pyglet.image.Texture.create_for_size(GL_TEXTURE_RECTANGLE_ARB, self.width, self.height, internalformat=GL_RGBA)
         glTexParameteri(texture.target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
         glTexParameteri(texture.target, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
         self.texture = texture
-        # Create fullscreen quad (batch)
-        batch = pyglet.graphics.Batch()
-        batch.add(4, GL_QUADS, None, 
-            ('v2i', (0, 0, self.width, 0, self.width, self.height, 0, self.height)), 
-            ('t2f', (0, 0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0))
-        )
-        self.batch = batch
+        # Fullscreen quad, shared by windows of the same size
+        self.batch = geometry.quad(self.width, self.height)
         # General GL Setup
         self.setup_gl()
         # Key tracking
@@ -65,7 +73,7 @@ class ShaderWindow(pyglet.window.Window):
         glMatrixMode(GL_MODELVIEW)
         
         self.shader.bind()
-        shader.uniformf('pixel', 1.0/width, 1.0/height)
+        self.shader.uniformf('pixel', 1.0/width, 1.0/height)
         self.shader.unbind()
     
         # copy the framebuffer, which also resizes the texture
@@ -98,7 +106,8 @@ class ShaderWindow(pyglet.window.Window):
         
         self.shader.bind()
         
-        shader.uniformf('seed', random() * 100000)
+        self.shader.uniformi('frame', self.frame)
+        self.frame += 1
         
         self.batch.draw()
         
@@ -107,9 +116,10 @@ class ShaderWindow(pyglet.window.Window):
         
         # copy the result back into the texture
         self.copyFramebuffer(self.texture)
+        startup.first_frame()
 
 # create our shader
-shader = Shader(['''
+shader = Shader(['''#version 130
 varying vec3  Position;
 
 void main()
@@ -119,23 +129,19 @@ void main()
     // pass through the texture coordinate
     gl_TexCoord[0] = gl_MultiTexCoord0;
 }
-'''], ['''
+'''], ['#version 130\n', rng.glsl, '''
 uniform sampler2DRect tex0;
 uniform vec2 pixel;
-uniform float seed;
-
-float rnd(vec2 co){
- return fract(sin(dot(co.xy ,vec2(12.9898,78.233))) * seed);
-}
+uniform int frame;
+uniform int seed;
 
 void main() {
-    vec2 pos = gl_TexCoord[0].xy;
-    vec2 rpos = pos / pixel;
+    uvec4 r = rng(uvec2(gl_FragCoord.xy), frame, seed);
 
-    //gl_FragColor = (mod(rpos.x, 5.0) <= 1.0 || mod(rpos.y, 5.0) <= 1.0) ? vec4(rnd(rpos), rnd(vec2(seed*rpos.y, seed*seed)), rnd(vec2(rpos.x-rpos.y, rpos.y-rpos.x)),1.0) : vec4(0.0);
-    gl_FragColor = vec4(rnd(rpos), rnd(vec2(seed-rpos.y, seed-rpos.x)), rnd(vec2(rpos.x-rpos.y, rpos.y-rpos.x)),1.0);
+    gl_FragColor = vec4(rng_unorm8(r).rgb, 1.0);
 }
 '''])
+startup.mark('import')
 
 
 def run():
@@ -0,0 +1,246 @@
+#
+# A small render graph for multi-pass effects.
+#
+# Passes are added in execution order. Each one names the textures it
+# reads, the texture it writes (None for the window) and that texture's
+# size and format:
+#
+#   graph = RenderGraph(window.width, window.height)
+#   graph.add_pass('scene', draw_scene, output='scene')
+#   graph.add_pass('stats', draw_downsample, ['scene'], 'small', size=0.25)
+#   graph.add_pass('present', draw_palette, ['scene'])
+#   graph.execute()
+#
+# Passes whose output nobody reads are culled ('stats' above, unless
+# 'small' is kept). Outputs come from a pool of FBO textures keyed by
+# (width, height, format) and a texture is handed to the next pass that
+# needs one of its kind as soon as its last reader has run, so
+# intermediates whose lifetimes don't overlap share memory. Kept
+# textures are never shared and survive between frames, which is how a
+# pass reads the previous frame (the copyFramebuffer feedback in the
+# demos): it lists a kept texture as an input before the pass that
+# writes it.
+#
+
+import time
+
+import pyglet
+from pyglet.gl import *
+
+from framebuffer import Framebuffer
+from gputimer import GpuTimer
+
+# bytes per pixel of the formats the pool knows about
+format_bytes = {
+    GL_RGBA : 4,
+    GL_RGBA8 : 4,
+    GL_RGBA16F_ARB : 8,
+    GL_RGBA32F_ARB : 16,
+}
+
+def quad(width, height, s=None, t=None):
+    """Draw a width x height quad; texcoords default to pixels, for sampler2DRect."""
+    s = width if s is None else s
+    t = height if t is None else t
+    pyglet.graphics.draw(4, GL_QUADS,
+        ('v2f', (0, 0, width, 0, width, height, 0, height)),
+        ('t2f', (0.0, 0.0, s, 0.0, s, t, 0.0, t))
+    )
+
+class TexturePool:
+    """Framebuffers, reused by (width, height, format)."""
+    def __init__(self):
+        self.free = {}
+        self.targets = []
+
+    def acquire(self, width, height, format):
+        free = self.free.get((width, height, format))
+        if free:
+            return free.pop()
+        target = Framebuffer(width, height, format)
+        target.format = format
+        self.targets.append(target)
+        return target
+
+    def release(self, target):
+        self.free.setdefault((target.width, target.height, target.format), []).append(target)
+
+    def reset(self):
+        # everything is free again, ready for a new allocation plan
+        self.free = {}
+        for target in self.targets:
+            self.release(target)
+
+    def trim(self, used):
+        # delete whatever the current plan does not use
+        for target in self.targets[:]:
+            if target not in used:
+                self.targets.remove(target)
+                target.delete()
+        self.free = {}
+
+    def memory(self):
+        return sum([t.width * t.height * format_bytes.get(t.format, 4) for t in self.targets])
+
+class Pass:
+    def __init__(self, name, draw, inputs, output, size, format):
+        self.name = name
+        self.draw = draw
+        self.inputs = list(inputs)
+        self.output = output
+        self.size = size
+        self.format = format
+        # cpu time of the last frame, in milliseconds
+        self.cpu = 0.0
+        self.timer = GpuTimer()
+
+class RenderGraph:
+    def __init__(self, width, height, timing=True):
+        self.width, self.height = width, height
+        self.timing = timing
+        self.passes = []
+        self.kept = set()
+        self.pool = TexturePool()
+        # the compiled plan: live passes in order, and a target per output
+        self.plan = None
+        self.targets = {}
+        self.frame = 0
+
+    def add_pass(self, name, draw, inputs=(), output=None, size=1.0, format=GL_RGBA):
+        """Add a pass; draw(graph, pass, width, height) is called with the
+        inputs bound to texture units 0..n and the output bound as target.
+        size is a scale of the graph size, a (width, height) pair or a
+        function of the graph size returning one."""
+        for existing in self.passes:
+            if output is not None and existing.output == output:
+                raise ValueError('%s is already written by %s' % (output, existing.name))
+        if output is not None and output in inputs:
+            raise ValueError('%s reads its own output %s' % (name, output))
+        self.passes.append(Pass(name, draw, inputs, output, size, format))
+        self.plan = None
+
+    def remove_pass(self, name):
+        self.passes = [p for p in self.passes if p.name != name]
+        self.plan = None
+
+    def keep(self, *names):
+        """Keep textures alive across frames, and their passes from being culled."""
+        self.kept.update(names)
+        self.plan = None
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        self.plan = None
+
+    def delete(self):
+        """Free every texture of the pool; the graph reallocates them if
+        it is executed again."""
+        self.pool.trim([])
+        self.targets = {}
+        self.plan = None
+
+    def resolve_size(self, size):
+        if callable(size):
+            return size(self.width, self.height)
+        if isinstance(size, tuple):
+            return size
+        return max(1, int(self.width * size)), max(1, int(self.height * size))
+
+    def compile(self):
+        # cull: walk back from the window and the kept textures
+        needed = set(self.kept)
+        live = []
+        for p in reversed(self.passes):
+            if p.output is None or p.output in needed:
+                live.append(p)
+                needed.update(p.inputs)
+        live.reverse()
+
+        producers = dict([(p.output, i) for i, p in enumerate(live) if p.output is not None])
+        last = {}
+        for i, p in enumerate(live):
+            for name in p.inputs:
+                if name not in producers:
+                    raise ValueError('%s reads %s, which no pass writes' % (p.name, name))
+                if producers[name] > i and name not in self.kept:
+                    raise ValueError('%s reads %s before it is written' % (p.name, name))
+                last[name] = max(last.get(name, i), i)
+
+        # kept textures first: reuse last plan's where nothing changed,
+        # so they keep their contents, then give the rest new ones
+        self.pool.reset()
+        targets = {}
+        kept = [p for p in live if p.output in self.kept]
+        for p in kept:
+            width, height = self.resolve_size(p.size)
+            old = self.targets.get(p.output)
+            if old is not None and (old.width, old.height, old.format) == (width, height, p.format):
+                self.pool.free[(width, height, p.format)].remove(old)
+                targets[p.output] = old
+        for p in kept:
+            if p.output not in targets:
+                targets[p.output] = self.pool.acquire(*self.resolve_size(p.size) + (p.format,))
+
+        # then the transient ones, handing textures back as soon as their
+        # last reader has run
+        for i, p in enumerate(live):
+            if p.output is not None and p.output not in targets:
+                targets[p.output] = self.pool.acquire(*self.resolve_size(p.size) + (p.format,))
+            for name in set(p.inputs):
+                if name not in self.kept and last[name] == i:
+                    self.pool.release(targets[name])
+        self.pool.trim(targets.values())
+
+        self.plan = live
+        self.targets = targets
+        return live
+
+    def execute(self):
+        if self.plan is None:
+            self.compile()
+        for p in self.plan:
+            self.run_pass(p)
+        self.frame += 1
+
+    def run_pass(self, p):
+        start = time.time()
+        if self.timing:
+            p.timer.begin()
+
+        for unit, name in enumerate(p.inputs):
+            texture = self.targets[name].texture
+            glActiveTexture(GL_TEXTURE0 + unit)
+            glBindTexture(texture.target, texture.id)
+
+        if p.output is None:
+            p.draw(self, p, self.width, self.height)
+        else:
+            target = self.targets[p.output]
+            target.bind()
+            p.draw(self, p, target.width, target.height)
+            target.unbind()
+
+        for unit, name in reversed(list(enumerate(p.inputs))):
+            glActiveTexture(GL_TEXTURE0 + unit)
+            glBindTexture(self.targets[name].texture.target, 0)
+
+        if self.timing:
+            p.timer.end()
+        p.cpu = (time.time() - start) * 1000.0
+
+    def report(self):
+        """Per-pass timings of the last frame and pool memory, as text."""
+        if self.plan is None:
+            self.compile()
+        lines = []
+        for p in self.passes:
+            if p not in self.plan:
+                lines.append('%-16s culled' % p.name)
+                continue
+            if p.output is None:
+                target = 'window'
+            else:
+                target = '%s %dx%d' % (p.output, self.targets[p.output].width, self.targets[p.output].height)
+            lines.append('%-16s cpu %7.3fms  gpu %7.3fms  -> %s' % (p.name, p.cpu, p.timer.elapsed, target))
+        lines.append('pool: %d textures, %.1f KiB' % (len(self.pool.targets), self.pool.memory() / 1024.0))
+        return '\n'.join(lines)
@@ -0,0 +1,346 @@
+#
+# Record and replay a demo session, for perf runs that can be reproduced.
+#
+#   python replay.py record mandelbrot session.log
+#   python replay.py play mandelbrot session.log [dt] [--windowed]
+#
+# Recording attaches to a live ShaderWindow and logs, in order, every
+# input event, every update() tick with its dt, at whatever rate the
+# demo schedules them, every draw and every uniform value that changed
+# since the previous draw. Playing back drives a fresh ShaderWindow of
+# the same demo from that log instead of the mouse and the wall clock:
+# updates get the recorded dt, or a fixed one if given, and frames are
+# drawn as fast as the GPU allows. The uniforms seen during playback are
+# checked against the recorded ones, and each frame can be hashed to
+# diff the output across versions; the window is hidden unless
+# --windowed is given, so frames are then drawn into an offscreen target
+# and hashed from there. A window with an iteration profile
+# (mandelbrot.py --profile) also has its per-frame stats collected.
+#
+
+import sys
+import time
+import struct
+import hashlib
+
+import pyglet
+from pyglet.gl import glFinish, glReadPixels, GL_RGBA, GL_UNSIGNED_BYTE
+
+from framebuffer import Framebuffer
+
+magic = 'SHRL'
+version = 1
+
+# record types
+NAME, EVENT, UPDATE, DRAW, UNIFORM = range(5)
+
+# the input events that are logged
+events = ['on_key_press', 'on_key_release', 'on_mouse_motion', 'on_mouse_drag',
+    'on_mouse_press', 'on_mouse_release', 'on_mouse_scroll']
+
+class LogWriter:
+    """Compact binary log of a session.
+
+    Every record is a type byte followed by its payload. Event and uniform
+    names are sent once as NAME records and referred to by a short id.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.names = {}
+        self.file.write(magic + struct.pack('<B', version))
+
+    def name(self, name):
+        id = self.names.get(name)
+        if id is None:
+            id = self.names[name] = len(self.names)
+            self.file.write(struct.pack('<BHB', NAME, id, len(name)) + name)
+        return id
+
+    def values(self, vals):
+        # ints stay ints, so key symbols and buttons come back unchanged
+        format = ''.join(['q' if isinstance(v, (int, long)) else 'd' for v in vals])
+        return struct.pack('<B', len(vals)) + format + struct.pack('<' + format, *vals)
+
+    def event(self, name, args):
+        self.file.write(struct.pack('<BH', EVENT, self.name(name)) + self.values(args))
+
+    def update(self, dt):
+        self.file.write(struct.pack('<Bd', UPDATE, dt))
+
+    def draw(self):
+        self.file.write(struct.pack('<B', DRAW))
+
+    def uniform(self, name, vals):
+        self.file.write(struct.pack('<BH', UNIFORM, self.name(name)) + self.values(vals))
+
+    def close(self):
+        self.file.close()
+
+def read_log(file):
+    """Yield the records of a log as tuples: (EVENT, name, args),
+    (UPDATE, dt), (DRAW,) and (UNIFORM, name, values)."""
+    data = file.read()
+    if data[:4] != magic or struct.unpack_from('<B', data, 4)[0] != version:
+        raise ValueError('not a version %d session log' % version)
+    names = {}
+    pos = 5
+
+    def values(pos):
+        count, = struct.unpack_from('<B', data, pos)
+        format = '<' + data[pos + 1:pos + 1 + count]
+        pos += 1 + count
+        return struct.unpack_from(format, data, pos), pos + struct.calcsize(format)
+
+    while pos < len(data):
+        kind, = struct.unpack_from('<B', data, pos)
+        pos += 1
+        if kind == NAME:
+            id, length = struct.unpack_from('<HB', data, pos)
+            pos += 3
+            names[id] = data[pos:pos + length]
+            pos += length
+        elif kind == EVENT or kind == UNIFORM:
+            id, = struct.unpack_from('<H', data, pos)
+            vals, pos = values(pos + 2)
+            yield (kind, names[id], vals)
+        elif kind == UPDATE:
+            dt, = struct.unpack_from('<d', data, pos)
+            pos += 8
+            yield (UPDATE, dt)
+        elif kind == DRAW:
+            yield (DRAW,)
+        else:
+            raise ValueError('bad record type %d at offset %d' % (kind, pos - 1))
+
+def watch_uniforms(shader, callback):
+    """Report every uniformf/uniformi call on shader to callback(name, vals).
+
+    uniformf values are reported as floats, so the setter used can be told
+    from the values alone."""
+    for kind, cast in (('f', float), ('i', int)):
+        def wrap(call, cast):
+            def uniform(name, *vals):
+                callback(name, tuple([cast(v) for v in vals]))
+                return call(name, *vals)
+            return uniform
+        setattr(shader, 'uniform' + kind, wrap(getattr(shader, 'uniform' + kind), cast))
+
+class UniformTracker:
+    """Uniform values set between two draws, minus the unchanged ones."""
+    def __init__(self):
+        # values as of the last flush, and the ones that differ since
+        self.drawn = {}
+        self.changed = {}
+
+    def __call__(self, name, vals):
+        if self.drawn.get(name) != vals:
+            self.changed[name] = vals
+        else:
+            self.changed.pop(name, None)
+
+    def flush(self):
+        changed, self.changed = self.changed, {}
+        self.drawn.update(changed)
+        return changed
+
+class Recorder:
+    """Log the session of a live ShaderWindow to the LogWriter log.
+
+    uniforms is a UniformTracker already watching the window's shader,
+    from demo_window, so the uniforms set while building the window are
+    logged too; without one only those set from here on are. Update
+    ticks are logged by the window itself, built by demo_window with
+    updates=log.update, so it keeps its own schedule.
+    """
+    def __init__(self, window, log, uniforms=None):
+        self.window = window
+        self.log = log
+        if uniforms is None:
+            uniforms = UniformTracker()
+            watch_uniforms(window.shader, uniforms)
+        self.uniforms = uniforms
+        # input events are seen before the window's own handlers
+        for name in events:
+            setattr(self, name, self.logger(name))
+        window.push_handlers(self)
+
+    def logger(self, name):
+        def log(*args):
+            self.log.event(name, args)
+        return log
+
+    def on_draw(self):
+        # uniforms set since the previous draw belong to that draw
+        self.flush()
+        self.log.draw()
+
+    def flush(self):
+        for name, vals in sorted(self.uniforms.flush().items()):
+            self.log.uniform(name, vals)
+
+    def close(self):
+        self.flush()
+        self.log.close()
+
+class Replayer:
+    """Drive a ShaderWindow from a session log, as fast as possible.
+
+    uniforms is a UniformTracker watching the shader, as for Recorder.
+    """
+    def __init__(self, window, file, dt=None, capture=False, offscreen=False, uniforms=None):
+        self.window = window
+        self.records = list(read_log(file))
+        # a fixed timestep, or None to use the recorded ones
+        self.dt = dt
+        self.capture = capture
+        # draw into a texture rather than the window, which a hidden
+        # window needs: its own pixels are undefined
+        self.target = None
+        if offscreen:
+            self.target = Framebuffer(*window.get_size())
+        # the window must not tick on the wall clock
+        pyglet.clock.unschedule(window.update)
+        if uniforms is None:
+            uniforms = UniformTracker()
+            watch_uniforms(window.shader, uniforms)
+        self.uniforms = uniforms
+        self.restore()
+
+    def restore(self):
+        # the uniforms logged before the first draw were set while the
+        # window was built, some from per-run state such as randomshader's
+        # random seed, so set the recorded values again
+        shader = self.window.shader
+        shader.bind()
+        for record in self.records:
+            if record[0] == DRAW:
+                break
+            if record[0] == UNIFORM:
+                name, vals = record[1], record[2]
+                if [v for v in vals if not isinstance(v, (int, long))]:
+                    shader.uniformf(name, *vals)
+                else:
+                    shader.uniformi(name, *vals)
+        shader.unbind()
+
+    def frame_hash(self):
+        if self.target is not None:
+            width, height = self.target.width, self.target.height
+            pixels = (pyglet.gl.GLubyte * (width * height * 4))()
+            self.target.read(pixels)
+        else:
+            width, height = self.window.get_size()
+            pixels = (pyglet.gl.GLubyte * (width * height * 4))()
+            glReadPixels(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+        return hashlib.md5(buffer(pixels)).hexdigest()
+
+    def run(self):
+        """Play the log back; returns a report dict with the frame count,
+        wall time, the frames whose uniforms diverged from the recording,
+        if capturing, one hash per frame and, if the window is being
+        profiled, the stats of each profiled frame."""
+        window = self.window
+        window.switch_to()
+        frames = 0
+        diverged = []
+        hashes = []
+        profiled = []
+        last_profile = None
+        # the uniforms the recording saw for the frame being drawn
+        expected = {}
+        pending = False
+        start = time.time()
+
+        def check():
+            # the first draw only settles what the window was built with
+            changed = self.uniforms.flush()
+            if pending and changed != expected:
+                diverged.append(frames - 1)
+
+        for record in self.records:
+            kind = record[0]
+            if kind == EVENT:
+                window.dispatch_event(record[1], *record[2])
+            elif kind == UPDATE:
+                window.update(self.dt if self.dt is not None else record[1])
+            elif kind == DRAW:
+                check()
+                expected = {}
+                if self.target is not None:
+                    self.target.bind()
+                window.dispatch_event('on_draw')
+                if self.target is not None:
+                    self.target.unbind()
+                if self.capture:
+                    hashes.append(self.frame_hash())
+                profile = getattr(window, 'profile', None)
+                if profile is not None and profile.last is not last_profile:
+                    last_profile = profile.last
+                    profiled.append(last_profile)
+                window.flip()
+                frames += 1
+                pending = True
+            elif kind == UNIFORM:
+                expected[record[1]] = record[2]
+            if window.has_exit:
+                break
+        if pending:
+            check()
+        glFinish()
+        elapsed = time.time() - start
+        if self.target is not None:
+            self.target.delete()
+            self.target = None
+
+        return {'frames': frames, 'seconds': elapsed, 'diverged': diverged, 'hashes': hashes,
+            'profile': profiled}
+
+def demo_window(name, uniforms=None, updates=None):
+    """Build the demo's window; uniforms, if given, is told about every
+    uniform set from the start, construction included, and updates about
+    the dt of every update tick, however the demo schedules them."""
+    module = __import__(name)
+    if uniforms is not None:
+        watch_uniforms(module.shader, uniforms)
+    window_class = module.ShaderWindow
+    if updates is not None:
+        # the demo schedules its own update in __init__, so the hook has
+        # to be in place before that
+        class window_class(module.ShaderWindow):
+            def update(self, dt):
+                updates(dt)
+                module.ShaderWindow.update(self, dt)
+    return window_class(module.shader)
+
+def record(name, path):
+    uniforms = UniformTracker()
+    log = LogWriter(open(path, 'wb'))
+    window = demo_window(name, uniforms, log.update)
+    recorder = Recorder(window, log, uniforms)
+    try:
+        pyglet.app.run()
+    finally:
+        recorder.close()
+
+def play(name, path, dt=None, windowed=False):
+    uniforms = UniformTracker()
+    window = demo_window(name, uniforms)
+    if not windowed:
+        window.set_visible(False)
+    report = Replayer(window, open(path, 'rb'), dt, capture=True, offscreen=not windowed,
+        uniforms=uniforms).run()
+    window.close()
+    print '%d frames in %.3fs, %.1f fps' % (report['frames'], report['seconds'],
+        report['frames'] / max(report['seconds'], 1e-9))
+    print '%d frames with diverging uniforms' % len(report['diverged'])
+    for frame, digest in enumerate(report['hashes']):
+        print frame, digest
+    return report
+
+if "__main__" == __name__:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if args[0] == 'record':
+        record(args[1], args[2])
+    else:
+        play(args[1], args[2], float(args[3]) if len(args) > 3 else None,
+            '--windowed' in sys.argv)
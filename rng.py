@@ -0,0 +1,102 @@
+#
+# Counter-based random numbers for the shaders, with a NumPy twin.
+#
+# The generator is the pcg4d hash from Jarzynski & Olano, "Hash Functions
+# for GPU Rendering" (JCGT 2020). It is a pure function of a 4-vector of
+# unsigned ints - here (pixel x, pixel y, frame, seed) - so any pixel of
+# any frame can be recomputed on the CPU, bit for bit.
+#
+
+try:
+    import numpy
+except ImportError:
+    # the GLSL half works without numpy, only the CPU twin needs it
+    numpy = None
+
+# GLSL source for the generator, to be placed after the #version line
+# and before main() in a fragment shader source list
+glsl = '''
+uvec4 pcg4d(uvec4 v)
+{
+    v = v * 1664525u + 1013904223u;
+
+    v.x += v.y * v.w;
+    v.y += v.z * v.x;
+    v.z += v.x * v.y;
+    v.w += v.y * v.z;
+
+    v ^= v >> 16u;
+
+    v.x += v.y * v.w;
+    v.y += v.z * v.x;
+    v.z += v.x * v.y;
+    v.w += v.y * v.z;
+
+    return v;
+}
+
+// random uints for a pixel of a frame
+uvec4 rng(uvec2 pixel, int frame, int seed)
+{
+    return pcg4d(uvec4(pixel, uint(frame), uint(seed)));
+}
+
+// top 24 bits as a float in [0, 1), exact in single precision
+vec4 rng_unit(uvec4 v)
+{
+    return vec4(v >> 8u) * (1.0 / 16777216.0);
+}
+
+// top 8 bits as a normalised colour, survives an RGBA8 framebuffer exactly
+vec4 rng_unorm8(uvec4 v)
+{
+    return vec4(v >> 24u) / 255.0;
+}
+'''
+
+def pcg4d(x, y, z, w):
+    """NumPy pcg4d, the four inputs broadcast against each other."""
+    u32 = numpy.uint32
+    x, y, z, w = numpy.broadcast_arrays(*[numpy.asarray(v).astype(u32) for v in (x, y, z, w)])
+    # work on copies, uint32 arithmetic wraps just like GLSL; numpy warns
+    # about the wrapping of 0-d arrays, which here is the point
+    with numpy.errstate(over='ignore'):
+        mul, inc = u32(1664525), u32(1013904223)
+        x = x * mul + inc
+        y = y * mul + inc
+        z = z * mul + inc
+        w = w * mul + inc
+
+        x += y * w
+        y += z * x
+        z += x * y
+        w += y * z
+
+        shift = u32(16)
+        x ^= x >> shift
+        y ^= y >> shift
+        z ^= z >> shift
+        w ^= w >> shift
+
+        x += y * w
+        y += z * x
+        z += x * y
+        w += y * z
+
+    return numpy.stack((x, y, z, w), axis=-1)
+
+def rng(width, height, frame, seed):
+    """Random uints for a whole frame, shape (height, width, 4).
+
+    Rows are bottom-up, matching gl_FragCoord and glReadPixels.
+    """
+    y, x = numpy.indices((height, width), dtype=numpy.uint32)
+    return pcg4d(x, y, frame, seed)
+
+def rng_unit(v):
+    """Top 24 bits as float32 in [0, 1), as rng_unit() in GLSL."""
+    return (v >> numpy.uint32(8)).astype(numpy.float32) * numpy.float32(1.0 / 16777216.0)
+
+def rng_unorm8(v):
+    """Top 8 bits as bytes, as rng_unorm8() in GLSL after an RGBA8 readback."""
+    return (v >> numpy.uint32(24)).astype(numpy.uint8)
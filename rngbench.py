@@ -0,0 +1,133 @@
+#
+# Throughput and quality checks for the counter-based generator in rng.py.
+#
+#   python rngbench.py [frames]
+#
+# Renders the randomshader.py noise on the GPU, into an offscreen target,
+# and the same frames with the NumPy twin, reports Mpixel/s for both,
+# checks that the GPU readback matches the CPU stream bit for bit and
+# runs some basic statistical tests on the CPU stream.
+#
+
+import sys
+import math
+import time
+
+import numpy
+
+import rng
+
+# z-scores beyond this are reported as failures
+z_limit = 4.0
+
+def cpu_throughput(width, height, frames, seed):
+    start = time.time()
+    for frame in range(frames):
+        rng.rng_unorm8(rng.rng(width, height, frame, seed))
+    elapsed = time.time() - start
+    return frames * width * height / elapsed / 1e6
+
+def gpu_throughput(frames, seed):
+    # only pull in pyglet when the GPU half is asked for
+    from pyglet.gl import glFinish, glPushAttrib, glPopAttrib, glDisable, GL_ENABLE_BIT, GL_BLEND
+    import randomshader
+    from framebuffer import Framebuffer
+
+    window = randomshader.ShaderWindow(randomshader.shader, seed)
+    window.switch_to()
+    # time the generator alone: a plain quad into an offscreen target, so
+    # neither the window's clear and feedback copy nor pixel ownership of
+    # a covered window come into it
+    size = window.width, window.height
+    target = Framebuffer(*size)
+    shader = window.shader
+
+    def draw(frame):
+        shader.bind()
+        shader.uniformi('frame', frame)
+        window.batch.draw()
+        shader.unbind()
+
+    target.bind()
+    glPushAttrib(GL_ENABLE_BIT)
+    glDisable(GL_BLEND)
+    # warm up, so the compile and first upload are not counted
+    draw(0)
+    glFinish()
+
+    start = time.time()
+    for frame in range(frames):
+        draw(frame)
+    glFinish()
+    elapsed = time.time() - start
+    glPopAttrib()
+    target.unbind()
+
+    # read back the last frame to compare against the CPU twin
+    pixels = numpy.zeros((size[1], size[0], 4), dtype=numpy.uint8)
+    target.read(pixels.ctypes.data)
+    target.delete()
+    window.close()
+
+    return frames * size[0] * size[1] / elapsed / 1e6, size, pixels
+
+def verify(pixels, width, height, frame, seed):
+    """Number of pixels whose rgb differs from the CPU stream."""
+    expected = rng.rng_unorm8(rng.rng(width, height, frame, seed))
+    return int(numpy.any(pixels[..., :3] != expected[..., :3], axis=-1).sum())
+
+def z_mean(units):
+    # uniform on [0, 1) has mean 1/2 and variance 1/12
+    return (units.mean() - 0.5) / math.sqrt(1.0 / 12.0 / units.size)
+
+def z_chi2_bytes(values):
+    # chi-square over the 256 byte buckets, normal approximation with 255 dof
+    counts = numpy.bincount(values.ravel(), minlength=256).astype(numpy.float64)
+    expected = values.size / 256.0
+    chi2 = ((counts - expected) ** 2 / expected).sum()
+    return (chi2 - 255.0) / math.sqrt(2.0 * 255.0)
+
+def z_monobit(words):
+    # every bit of every word is a fair coin
+    bits = numpy.unpackbits(words.view(numpy.uint8))
+    n = bits.size
+    return (bits.sum() - n / 2.0) / math.sqrt(n / 4.0)
+
+def z_correlation(a, b):
+    # pearson correlation of independent streams is ~N(0, 1/n)
+    r = numpy.corrcoef(a.ravel(), b.ravel())[0, 1]
+    return r * math.sqrt(a.size)
+
+def quality(width, height, frames, seed):
+    words = numpy.stack([rng.rng(width, height, frame, seed) for frame in range(frames)])
+    units = rng.rng_unit(words).astype(numpy.float64)
+    other = rng.rng_unit(rng.rng(width, height, 0, seed + 1)).astype(numpy.float64)
+    return [
+        ('mean', z_mean(units)),
+        ('chi2 bytes', z_chi2_bytes(rng.rng_unorm8(words))),
+        ('monobit', z_monobit(words)),
+        ('horizontal neighbours', z_correlation(units[:, :, :-1, 0], units[:, :, 1:, 0])),
+        ('vertical neighbours', z_correlation(units[:, :-1, :, 0], units[:, 1:, :, 0])),
+        ('consecutive frames', z_correlation(units[:-1, ..., 0], units[1:, ..., 0])),
+        ('channels r/g', z_correlation(units[..., 0], units[..., 1])),
+        ('adjacent seeds', z_correlation(units[0, ..., 0], other[..., 0])),
+    ]
+
+def run(frames=100, seed=1234):
+    gpu, (width, height), pixels = gpu_throughput(frames, seed)
+    cpu = cpu_throughput(width, height, frames, seed)
+    print 'gpu  %10.1f Mpixel/s' % gpu
+    print 'cpu  %10.1f Mpixel/s' % cpu
+    mismatched = verify(pixels, width, height, frames - 1, seed)
+    print 'gpu/cpu mismatched pixels: %d of %d' % (mismatched, width * height)
+
+    failed = mismatched > 0
+    for name, z in quality(width, height, 8, seed):
+        ok = abs(z) < z_limit
+        failed = failed or not ok
+        print '%-24s z = %+7.2f  %s' % (name, z, 'ok' if ok else 'FAIL')
+    return not failed
+
+if "__main__" == __name__:
+    ok = run(*[int(arg) for arg in sys.argv[1:2]])
+    sys.exit(0 if ok else 1)
@@ -5,26 +5,39 @@
 # (see http://www.boost.org/LICENSE_1_0.txt)
 #
 
+import time
+
 from pyglet.gl import *
 
 class Shader:
     # vert, frag and geom take arrays of source strings
     # the arrays will be concattenated into one string by OpenGL
+    # nothing is compiled until the program is first bound, so shaders
+    # can be defined at import time, before there is a GL context
     def __init__(self, vert = [], frag = [], geom = []):
-        # create the program handle
-        self.handle = glCreateProgram()
+        self.vert, self.frag, self.geom = vert, frag, geom
+        # we have no program yet
+        self.handle = None
         # we are not linked yet
         self.linked = False
+        # seconds spent compiling and linking, once compiled
+        self.compile_time = None
+
+    def compile(self):
+        start = time.time()
+        # create the program handle
+        self.handle = glCreateProgram()
 
         # create the vertex shader
-        self.createShader(vert, GL_VERTEX_SHADER)
+        self.createShader(self.vert, GL_VERTEX_SHADER)
         # create the fragment shader
-        self.createShader(frag, GL_FRAGMENT_SHADER)
+        self.createShader(self.frag, GL_FRAGMENT_SHADER)
         # the geometry shader will be the same, once pyglet supports the extension
         # self.createShader(frag, GL_GEOMETRY_SHADER_EXT)
 
         # attempt to link the program
         self.link()
+        self.compile_time = time.time() - start
 
     def createShader(self, strings, type):
         count = len(strings)
@@ -84,6 +97,9 @@ class Shader:
             self.linked = True
 
     def bind(self):
+        # compile on first use, in whatever context is current
+        if self.handle is None:
+            self.compile()
         # bind the program
         glUseProgram(self.handle)
 
@@ -118,11 +134,197 @@ class Shader:
                 # retrieve the uniform location, and set
             }[len(vals)](glGetUniformLocation(self.handle, name), *vals)
 
-    # upload a uniform matrix
-    # works with matrices stored as lists,
-    # as well as euclid matrices
+    # upload an array of floating point uniforms, each of size 1-4
+    # vals may be a list, a ctypes array, a numpy array or an array.array;
+    # those already holding 32 bit floats are passed to OpenGL without a
+    # copy, the rest are converted value by value
+    # this program must be currently bound
+    def uniformfv(self, name, size, vals):
+        data = _array(vals, c_float, 'float32')
+        # select the correct function
+        { 1 : glUniform1fv,
+            2 : glUniform2fv,
+            3 : glUniform3fv,
+            4 : glUniform4fv
+            # retrieve the uniform location, and set
+        }[size](glGetUniformLocation(self.handle, name), len(data) // size, data)
+
+    # upload an array of integer uniforms, each of size 1-4
+    # this program must be currently bound
+    def uniformiv(self, name, size, vals):
+        data = _array(vals, c_int, 'int32')
+        # select the correct function
+        { 1 : glUniform1iv,
+            2 : glUniform2iv,
+            3 : glUniform3iv,
+            4 : glUniform4iv
+            # retrieve the uniform location, and set
+        }[size](glGetUniformLocation(self.handle, name), len(data) // size, data)
+
+    # upload a uniform matrix, or an array of them
+    # works with matrices stored as lists, euclid matrices,
+    # as well as numpy arrays and buffers of column-major floats
     def uniform_matrixf(self, name, mat):
         # obtian the uniform location
-        loc = glGetUniformLocation(self.Handle, name)
-        # uplaod the 4x4 floating point matrix
-        glUniformMatrix4fv(loc, 1, False, (c_float * 16)(*mat))
+        loc = glGetUniformLocation(self.handle, name)
+        # uplaod the 4x4 floating point matrices
+        data = _array(mat, c_float, 'float32')
+        glUniformMatrix4fv(loc, len(data) // 16, False, data)
+
+    # connect the named uniform block of this program to a binding point
+    def uniform_block(self, name, binding):
+        if self.handle is None:
+            self.compile()
+        index = glGetUniformBlockIndex(self.handle, name)
+        glUniformBlockBinding(self.handle, index, binding)
+
+# convert uniform values into a ctypes array of ctype
+def _array(vals, ctype, dtype):
+    # ctypes arrays of the right type go straight through
+    if isinstance(vals, Array) and vals._type_ is ctype:
+        return vals
+    # numpy arrays are brought to the right type and layout, which
+    # only copies if they are not there already
+    if hasattr(vals, '__array_interface__'):
+        vals = vals.astype(dtype, order='C', copy=False)
+    else:
+        format = _format(vals)
+        if format == '':
+            raise TypeError('untyped buffer, pass %s values instead' % dtype)
+        if format not in _formats[ctype]:
+            # anything else is converted value by value
+            vals = list(vals)
+            return (ctype * len(vals))(*vals)
+    # a buffer already holding ctype values is wrapped in place
+    count = len(buffer(vals)) // sizeof(ctype)
+    try:
+        return (ctype * count).from_buffer(vals)
+    except TypeError:
+        # read-only buffers have to be copied
+        return (ctype * count).from_buffer_copy(vals)
+
+# buffer item formats, with their size, that hold each ctype as it is
+_formats = {
+    c_float : [('f', 4)],
+    c_int : [('i', 4), ('l', 4)],
+}
+
+# the item format and size of a buffer, None for plain sequences and ''
+# for raw bytes, which say nothing about what they hold
+def _format(vals):
+    if hasattr(vals, 'typecode'):
+        # array.array, which has no memoryview in python 2
+        return vals.typecode, vals.itemsize
+    try:
+        view = memoryview(vals)
+    except TypeError:
+        return None
+    if view.format in ('B', 'b', 'c'):
+        return ''
+    # native or little endian only
+    format = view.format.lstrip('@=<')
+    return (format, view.itemsize)
+
+# std140 types: ctype, components and base alignment in bytes
+_std140 = {
+    'float' : (c_float, 1, 4),
+    'vec2' : (c_float, 2, 8),
+    'vec3' : (c_float, 3, 16),
+    'vec4' : (c_float, 4, 16),
+    'int' : (c_int, 1, 4),
+    'ivec2' : (c_int, 2, 8),
+    'ivec3' : (c_int, 3, 16),
+    'ivec4' : (c_int, 4, 16),
+    'mat4' : (c_float, 16, 16),
+}
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+class UniformBlock:
+    # a std140 uniform block, backed by a uniform buffer object
+    # fields is a list of (type, name) or (type, name, count) for arrays
+    # the block is shared by attaching it to any number of programs
+    def __init__(self, name, binding, fields):
+        self.name = name
+        self.binding = binding
+        self.fields = {}
+        self.order = []
+
+        # lay the fields out by the std140 rules
+        offset = 0
+        for field in fields:
+            type, member = field[:2]
+            count = field[2] if len(field) > 2 else None
+            ctype, components, alignment = _std140[type]
+            size = components * sizeof(ctype)
+            # array elements and matrix columns are padded out to vec4s
+            if count is not None or type == 'mat4':
+                alignment = 16
+                stride = _align(size, 16)
+            else:
+                stride = size
+            offset = _align(offset, alignment)
+            self.fields[member] = (offset, ctype, components, stride, count or 1)
+            self.order.append((type, member, count))
+            offset += stride * (count or 1)
+        self.size = _align(offset, 16)
+
+        # the cpu side copy, and the range of it the gpu has not seen yet
+        self.data = create_string_buffer(self.size)
+        self.dirty = None
+
+        # create the buffer object
+        handle = GLuint(0)
+        glGenBuffers(1, byref(handle))
+        self.handle = handle
+        glBindBuffer(GL_UNIFORM_BUFFER, handle)
+        glBufferData(GL_UNIFORM_BUFFER, self.size, self.data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    # the GLSL declaration of the block, to put in the shader source
+    def glsl(self):
+        members = []
+        for type, member, count in self.order:
+            members.append('    %s %s%s;\n' % (type, member, '' if count is None else '[%d]' % count))
+        return 'layout(std140) uniform %s\n{\n%s};\n' % (self.name, ''.join(members))
+
+    # store a field, or a whole array field, in the cpu side copy
+    # takes the same kinds of values as Shader.uniformfv
+    def set(self, name, vals):
+        offset, ctype, components, stride, count = self.fields[name]
+        data = _array(vals, ctype, 'float32' if ctype is c_float else 'int32')
+        size = components * sizeof(ctype)
+        elements = min(count, len(data) // components)
+        base = addressof(self.data) + offset
+        if stride == size:
+            # tightly packed, so copy it in one go
+            memmove(base, data, size * elements)
+        else:
+            for i in range(elements):
+                memmove(base + i * stride, addressof(data) + i * size, size)
+        # grow the dirty range to cover the field
+        end = offset + stride * elements
+        if self.dirty is None:
+            self.dirty = (offset, end)
+        else:
+            self.dirty = (min(self.dirty[0], offset), max(self.dirty[1], end))
+
+    # upload whatever changed since the last upload, in one call
+    def upload(self):
+        if self.dirty is None:
+            return
+        start, end = self.dirty
+        glBindBuffer(GL_UNIFORM_BUFFER, self.handle)
+        glBufferSubData(GL_UNIFORM_BUFFER, start, end - start, addressof(self.data) + start)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.dirty = None
+
+    # let a program read this block
+    def attach(self, shader):
+        shader.uniform_block(self.name, self.binding)
+
+    # upload any changes and bind the buffer to the block's binding point
+    def bind(self):
+        self.upload()
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.binding, self.handle)
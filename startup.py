@@ -0,0 +1,37 @@
+#
+# Startup profiling: time-to-first-frame, split into named steps.
+#
+# A demo imports this before anything else, calls mark() at the end of
+# each step - import, context creation, shader compile, asset load - and
+# first_frame() at the end of every on_draw. Run the demo with --startup
+# to have the breakdown printed once the first frame is drawn.
+#
+
+import sys
+import time
+
+# as near to process start as we can get without help
+started = time.time()
+marks = []
+drawn = False
+
+def mark(name):
+    marks.append((name, time.time()))
+
+def first_frame():
+    global drawn
+    if drawn:
+        return
+    drawn = True
+    mark('first frame')
+    if '--startup' in sys.argv:
+        print report()
+
+def report():
+    lines = []
+    last = started
+    for name, when in marks:
+        lines.append('%-20s %8.1fms' % (name, (when - last) * 1000.0))
+        last = when
+    lines.append('%-20s %8.1fms' % ('time to first frame', (last - started) * 1000.0))
+    return '\n'.join(lines)
@@ -1,31 +1,31 @@
+import startup
+
 import pyglet
 from pyglet.window import key
 from pyglet.gl import *
 
+import geometry
 from shader import Shader
 
 class ShaderWindow(pyglet.window.Window):
     def __init__(self, shader):
         # Create window
         super(ShaderWindow, self).__init__(640, 640, caption="Shader Testing")
+        startup.mark('context creation')
         # Shader constants
         shader.bind()
         shader.uniformi('tex0', 0)
         shader.uniformf('pixel', 1.0/self.width, 1.0/self.height)
         shader.unbind()
+        startup.mark('shader compile')
         self.shader = shader
         # Setup Texture
         texture = pyglet.image.Texture.create_for_size(GL_TEXTURE_RECTANGLE_ARB, self.width, self.height, internalformat=GL_RGBA)
         glTexParameteri(texture.target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
         glTexParameteri(texture.target, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
         self.texture = texture
-        # Create fullscreen quad (batch)
-        batch = pyglet.graphics.Batch()
-        batch.add(4, GL_QUADS, None, 
-            ('v2i', (0, 0, self.width, 0, self.width, self.height, 0, self.height)), 
-            ('t2f', (0, 0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0))
-        )
-        self.batch = batch
+        # Fullscreen quad, shared by windows of the same size
+        self.batch = geometry.quad(self.width, self.height)
         # General GL Setup
         self.setup_gl()
         # Key tracking
@@ -63,7 +63,7 @@ class ShaderWindow(pyglet.window.Window):
         glMatrixMode(GL_MODELVIEW)
         
         self.shader.bind()
-        shader.uniformf('pixel', 1.0/width, 1.0/height)
+        self.shader.uniformf('pixel', 1.0/width, 1.0/height)
         self.shader.unbind()
     
         # copy the framebuffer, which also resizes the texture
@@ -105,6 +105,7 @@ class ShaderWindow(pyglet.window.Window):
         
         # copy the result back into the texture
         self.copyFramebuffer(self.texture)
+        startup.first_frame()
 
 # create our shader
 shader = Shader(['''
@@ -128,6 +129,7 @@ void main() {
     gl_FragColor = (mod(rpos.x, 5.0) <= 1.0 || mod(rpos.y, 5.0) <= 1.0) ? vec4(1.0) : vec4(0.0);
 }
 '''])
+startup.mark('import')
 
 
 def run():
@@ -0,0 +1,288 @@
+#
+# Batched Mandelbrot/Julia thumbnails.
+#
+#   python thumbnails.py [count] [size]
+#
+# A batch of views (center, zoom, Julia constant, iterations and colours)
+# is packed into a float texture, one row per view, uploaded once and
+# rendered into an atlas with a single draw: one quad per view, each
+# carrying its row index in the third texture coordinate. render_numpy()
+# renders the same atlas on the CPU as broadcasted array ops over the
+# whole batch. run() reports thumbnails/s for both, and for drawing the
+# views one at a time through mandelbrot.py's shader. The batched shader
+# is built from the same iteration and colouring source as that one.
+#
+
+import sys
+import math
+import time
+
+import numpy
+
+import pyglet
+from pyglet.gl import *
+
+from shader import Shader
+from framebuffer import Framebuffer
+import mandelbrot
+
+class View:
+    """One parameter set; c is the Julia constant, or None for the Mandelbrot set."""
+    def __init__(self, center=(0.0, 0.0), zoom=1.0, c=None, iterations=50.0,
+            inner=(0.0, 0.0, 0.0), outer1=(1.0, 1.0, 1.0), outer2=(1.0, 1.0, 1.0)):
+        self.center = center
+        self.zoom = zoom
+        self.c = c
+        self.iterations = iterations
+        self.inner = inner
+        self.outer1 = outer1
+        self.outer2 = outer2
+
+# texels per view in the parameter texture
+texels = 5
+
+def pack(views):
+    """Parameter texture contents, shape (len(views), texels, 4)."""
+    params = numpy.zeros((len(views), texels, 4), dtype=numpy.float32)
+    for row, view in zip(params, views):
+        row[0] = view.center[0], view.center[1], view.zoom, view.iterations
+        if view.c is not None:
+            row[1] = view.c[0], view.c[1], 1.0, 0.0
+        row[2, :3] = view.inner
+        row[3, :3] = view.outer1
+        row[4, :3] = view.outer2
+    return params
+
+def layout(count, size, columns=None):
+    """Columns, rows and atlas size for count tiles of size pixels."""
+    if columns is None:
+        columns = int(math.ceil(math.sqrt(count)))
+    rows = int(math.ceil(count / float(columns)))
+    return columns, rows, columns * size, rows * size
+
+def tile_origin(index, size, columns):
+    # tiles fill the atlas left to right, bottom to top
+    return (index % columns) * size, (index // columns) * size
+
+class BatchRenderer:
+    """Render a batch of views into an atlas with one draw call."""
+    def __init__(self, shader, views, size, columns=None):
+        self.size = size
+        self.columns, self.rows, width, height = layout(len(views), size, columns)
+        self.atlas = Framebuffer(width, height)
+        # parameter texture
+        handle = GLuint(0)
+        glGenTextures(1, byref(handle))
+        self.params = handle
+        glBindTexture(GL_TEXTURE_RECTANGLE_ARB, handle)
+        glTexParameteri(GL_TEXTURE_RECTANGLE_ARB, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_RECTANGLE_ARB, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glBindTexture(GL_TEXTURE_RECTANGLE_ARB, 0)
+        self.count = 0
+        self.upload(views)
+        # program
+        shader.bind()
+        shader.uniformi('Params', 0)
+        shader.unbind()
+        self.shader = shader
+
+    def upload(self, views):
+        """Replace the views, rebuilding the quads only if the count changed."""
+        data = pack(views)
+        glBindTexture(GL_TEXTURE_RECTANGLE_ARB, self.params)
+        glTexImage2D(GL_TEXTURE_RECTANGLE_ARB, 0, GL_RGBA32F_ARB, texels, len(views), 0,
+            GL_RGBA, GL_FLOAT, data.ctypes.data)
+        glBindTexture(GL_TEXTURE_RECTANGLE_ARB, 0)
+        if len(views) != self.count:
+            self.count = len(views)
+            self.quads = self.create_quads()
+
+    def create_quads(self):
+        size = self.size
+        vertices = []
+        texcoords = []
+        for index in range(self.count):
+            x, y = tile_origin(index, size, self.columns)
+            vertices.extend((x, y, x + size, y, x + size, y + size, x, y + size))
+            texcoords.extend((0.0, 0.0, index, 1.0, 0.0, index, 1.0, 1.0, index, 0.0, 1.0, index))
+        return pyglet.graphics.vertex_list(4 * self.count, ('v2f', vertices), ('t3f', texcoords))
+
+    def render(self):
+        self.atlas.bind()
+        self.atlas.clear()
+        glBindTexture(GL_TEXTURE_RECTANGLE_ARB, self.params)
+        self.shader.bind()
+        self.quads.draw(GL_QUADS)
+        self.shader.unbind()
+        glBindTexture(GL_TEXTURE_RECTANGLE_ARB, 0)
+        self.atlas.unbind()
+
+    def read(self):
+        pixels = numpy.zeros((self.atlas.height, self.atlas.width, 4), dtype=numpy.uint8)
+        self.atlas.read(pixels.ctypes.data)
+        return pixels
+
+def render_single(program, views, size, target, columns):
+    """The unbatched path: scalar uniforms and one draw per view, using
+    the uniforms of mandelbrot.py's shader."""
+    target.bind()
+    target.clear()
+    program.bind()
+    for index, view in enumerate(views):
+        program.uniformf('Xcenter', view.center[0])
+        program.uniformf('Ycenter', view.center[1])
+        program.uniformf('Zoom', view.zoom)
+        program.uniformf('MaxIterations', view.iterations)
+        program.uniformf('JuliaC', *(view.c or (0.0, 0.0)))
+        program.uniformf('Julia', 0.0 if view.c is None else 1.0)
+        program.uniformf('InnerColor', *view.inner)
+        program.uniformf('OuterColor1', *view.outer1)
+        program.uniformf('OuterColor2', *view.outer2)
+        x, y = tile_origin(index, size, columns)
+        pyglet.graphics.draw(4, GL_QUADS,
+            ('v2f', (x, y, x + size, y, x + size, y + size, x, y + size)),
+            ('t2f', (0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0))
+        )
+    program.unbind()
+    target.unbind()
+
+def render_numpy(views, size, columns=None):
+    """CPU fallback: the same atlas as BatchRenderer, as (height, width, 4) bytes."""
+    columns, rows, width, height = layout(len(views), size, columns)
+    params = pack(views)
+    column = lambda texel, component: params[:, texel, component][:, None, None]
+
+    # pixel centres, as the interpolated Position in the vertex shader
+    pos = ((numpy.arange(size, dtype=numpy.float32) + 0.5) / size - 0.5) * 5.0
+    shape = (len(views), size, size)
+    real = numpy.broadcast_to(pos[None, None, :] * column(0, 2) + column(0, 0), shape)
+    imag = numpy.broadcast_to(pos[None, :, None] * column(0, 2) + column(0, 1), shape)
+    julia = column(1, 2)
+    creal = real + (column(1, 0) - real) * julia
+    cimag = imag + (column(1, 1) - imag) * julia
+
+    iterations = column(0, 3)
+    r2 = numpy.zeros(shape, dtype=numpy.float32)
+    count = numpy.zeros(shape, dtype=numpy.int32)
+    for iter in range(int(math.ceil(params[:, 0, 3].max()))):
+        active = (r2 < 4.0) & (iter < iterations)
+        if not active.any():
+            break
+        next_real = real * real - imag * imag + creal
+        next_imag = 2.0 * real * imag + cimag
+        real = numpy.where(active, next_real, real)
+        imag = numpy.where(active, next_imag, imag)
+        r2 = numpy.where(active, real * real + imag * imag, r2)
+        count += active
+
+    # base the colour on the number of iterations
+    t = numpy.modf(count * numpy.float32(0.05))[0][..., None]
+    outer1, outer2 = params[:, None, None, 3, :3], params[:, None, None, 4, :3]
+    color = numpy.where((r2 < 4.0)[..., None], params[:, None, None, 2, :3],
+        outer1 + (outer2 - outer1) * t)
+
+    tiles = numpy.zeros((rows * columns, size, size, 4), dtype=numpy.uint8)
+    tiles[:len(views), ..., :3] = numpy.floor(numpy.clip(color, 0.0, 1.0) * 255.0 + 0.5)
+    tiles[:len(views), ..., 3] = 255
+    # tile index runs along the columns first, then up the rows
+    return tiles.reshape(rows, columns, size, size, 4).transpose(0, 2, 1, 3, 4).reshape(height, width, 4)
+
+def julia_views(count):
+    """Julia constants around the main cardioid, with a spread of palettes."""
+    views = []
+    for i in range(count):
+        a = 2.0 * math.pi * i / count
+        c = (0.5 * math.cos(a) - 0.25 * math.cos(2 * a), 0.5 * math.sin(a) - 0.25 * math.sin(2 * a))
+        outer = (0.5 + 0.5 * math.cos(a), 0.5 + 0.5 * math.sin(a), 1.0)
+        views.append(View(zoom=0.6, c=(c[0] * 1.02, c[1] * 1.02), iterations=100.0, outer1=outer, outer2=(0.0, 0.0, 0.2)))
+    return views
+
+def timed(render, repeats):
+    render()
+    glFinish()
+    start = time.time()
+    for i in range(repeats):
+        render()
+    glFinish()
+    return (time.time() - start) / repeats
+
+# create our shader, from mandelbrot.py's iteration loop and colouring so
+# that both paths run the same kernel; the parameters it reads from
+# uniforms are plain globals here, loaded from the view's texture row
+shader = Shader(['''#version 130
+varying vec3  Position;
+varying float Index;
+
+void main()
+{
+    Position        = vec3(gl_MultiTexCoord0.xy - 0.5, 0.0) * 5.0;
+    Index           = gl_MultiTexCoord0.z;
+    gl_Position     = ftransform();
+}
+'''], ['''#version 130
+varying float Index;
+
+uniform sampler2DRect Params;
+
+float MaxIterations;
+float Zoom;
+float Xcenter;
+float Ycenter;
+vec3  InnerColor;
+vec3  OuterColor1;
+vec3  OuterColor2;
+vec2  JuliaC;
+float Julia;
+
+vec4 param(int texel)
+{
+    return texture2DRect(Params, vec2(float(texel) + 0.5, floor(Index + 0.5) + 0.5));
+}
+
+void load_view()
+{
+    vec4 view  = param(0);
+    vec4 julia = param(1);
+
+    Xcenter       = view.x;
+    Ycenter       = view.y;
+    Zoom          = view.z;
+    MaxIterations = view.w;
+    JuliaC        = julia.xy;
+    Julia         = julia.z;
+    InnerColor    = param(2).rgb;
+    OuterColor1   = param(3).rgb;
+    OuterColor2   = param(4).rgb;
+}
+''', mandelbrot.iterate_source, mandelbrot.color_source, '''
+void main()
+{
+    load_view();
+
+    float r2;
+    float reason;
+    float iter = iterate(r2, reason);
+
+    gl_FragColor = vec4(colorize(iter, r2), 1.0);
+}
+'''])
+
+def run(count=64, size=128, repeats=10):
+    views = julia_views(count)
+    batch = BatchRenderer(shader, views, size)
+    single = Framebuffer(batch.atlas.width, batch.atlas.height)
+
+    batched = timed(batch.render, repeats)
+    unbatched = timed(lambda: render_single(mandelbrot.shader, views, size, single, batch.columns), repeats)
+    start = time.time()
+    render_numpy(views, size)
+    cpu = time.time() - start
+
+    print '%d views of %dx%d' % (count, size, size)
+    print 'batched     %10.1f thumbnails/s' % (count / batched)
+    print 'one by one  %10.1f thumbnails/s' % (count / unbatched)
+    print 'numpy       %10.1f thumbnails/s' % (count / cpu)
+
+if "__main__" == __name__:
+    window = pyglet.window.Window(visible=False)
+    run(*[int(arg) for arg in sys.argv[1:3]])
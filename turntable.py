@@ -1,3 +1,7 @@
+import startup
+
+import os
+import sys
 import math
 from math import pi
 
@@ -5,37 +9,40 @@ import pyglet
 from pyglet.window import key
 from pyglet.gl import *
 
+import geometry
 from shader import Shader as NewShader
+from assets import shared_atlas
+from pacing import FixedStep, FrameTimes, Metrics, schedule
+from latency import LatencyTracker
 import random
 
+# the cursor images live next to this script, wherever it is run from
+cursor_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'turntable')
+
 class ShaderWindow(pyglet.window.Window):
 
     sprite_files = ['eclipse.png', 'oval.png', 'bars.png', 'bevel.png', 'spiral.png', 'dots.png']
     num_keys = [key._0, key._1, key._2, key._3, key._4, key._5, key._6, key._7, key._8, key._9]
+    # per step, at steprate steps a second
     angleinc = 0.00009
+    steprate = 60.0
 
     def __init__(self, shader):
         # Create window
         super(ShaderWindow, self).__init__(1430, 890, caption="Shader Testing")
-        # Setup mouse
-        pyglet.resource.path.append('turntable')
-        pyglet.resource.reindex()
-        sprites = []
-        for file in self.sprite_files:
-            img = pyglet.resource.image(file)
-            img.anchor_x = img.width / 2
-            img.anchor_y = img.height / 2
-            cur = pyglet.sprite.Sprite(img)
-            cur.visible = False
-            sprites.append(cur)
-        self.cursors = sprites
-        self.cursors[-1].visible = True
+        startup.mark('context creation')
+        # Setup mouse, only the cursor shown is loaded now
+        self.atlas = shared_atlas(cursor_dir, self.sprite_files)
+        self.cursor_index = len(self.sprite_files) - 1
+        self.cursor = pyglet.sprite.Sprite(self.atlas.image(self.sprite_files[self.cursor_index]))
+        startup.mark('asset load')
         self.cursorpos = [self.width/2.0, self.height/2.0]
         # Setup shader
         shader.bind()
         shader.uniformi('tex0', 0)
         shader.uniformi('tex1', 1)
         shader.unbind()
+        startup.mark('shader compile')
         self.shader = shader
         
         # Setup Texture
@@ -43,33 +50,37 @@ class ShaderWindow(pyglet.window.Window):
         glTexParameteri(texture.target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
         glTexParameteri(texture.target, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
         self.texture = texture
-        # Create batch and quad
-        batch = pyglet.graphics.Batch()
-        batch.add(4, GL_QUADS, None, 
-            ('v2i', (0, 0, self.width, 0, self.width, self.height, 0, self.height)), 
-            ('t2f', (0, 0, self.width, 0, self.width, self.height, 0, self.height))
-        )
-        self.batch = batch
+        # Fullscreen quad, shared by windows of the same size
+        self.batch = geometry.quad(self.width, self.height, self.width, self.height)
         
         self.setup_gl()
-        #pyglet.clock.schedule(self.update)
-        pyglet.clock.schedule_interval(self.update, 1.0/30.0)
         self.keys = pyglet.window.key.KeyStateHandler()
         self.push_handlers(self.keys)
         self.pressed = False
         self.shading = False
-        # set update function
-        pyglet.clock.schedule_interval(self.update, 1.0/30.0)
         
         self.angledelta = 3.0
+        self.lastangledelta = 3.0
         self.angledir = 1.0
         self.angle = (2 * pi) / 3.0
+        # the turntable steps at a fixed rate, update just feeds it time
+        self.metrics = Metrics(enabled='--metrics' in sys.argv)
+        self.frametimes = FrameTimes()
+        self.stepper = FixedStep(self.step, self.steprate)
+        # set update function
+        schedule(self, self.update, self.steprate)
+        # input to display latency, reported on close
+        if '--latency' in sys.argv:
+            self.latency = LatencyTracker(self, {'on_mouse_motion': 'cursor',
+                'on_mouse_drag': 'paint', 'on_key_press': 'key'})
         
         self.set_exclusive_mouse()
+        # the other cursors are loaded in the background, one per tick
+        pyglet.clock.schedule_interval(self.prefetch_cursor, 0.25)
         
-    def _get_cursor(self):
-        return self.cursors[-1]
-    cursor = property(_get_cursor)
+    def prefetch_cursor(self, dt):
+        if not self.atlas.prefetch():
+            pyglet.clock.unschedule(self.prefetch_cursor)
         
     def update_cursor(self, dx, dy):
         self.cursorpos[0] += dx
@@ -100,10 +111,10 @@ class ShaderWindow(pyglet.window.Window):
         self.cursor.color = (rcomponent, gcomponent, bcomponent)
         
     def next_cursor(self):
-        spr = self.cursors.pop()
-        spr.visible = False
-        self.cursors.insert(0, spr)
-        self.cursor.visible = True            
+        # every cursor is a region of the same texture, so this is only
+        # new texture coordinates for the sprite
+        self.cursor_index = (self.cursor_index - 1) % len(self.sprite_files)
+        self.cursor.image = self.atlas.image(self.sprite_files[self.cursor_index])
 
     def setup_gl(self):
         pyglet.gl.glClearColor(1.0, 0.0, 0.0, 1.0)
@@ -130,7 +141,7 @@ class ShaderWindow(pyglet.window.Window):
         glMatrixMode(GL_MODELVIEW)
         
         self.shader.bind()
-        shader.uniformf('center', self.width/2.0, self.height/2.0)
+        self.shader.uniformf('center', self.width/2.0, self.height/2.0)
         self.shader.unbind()
     
         # copy the framebuffer, which also resizes the texture
@@ -156,11 +167,17 @@ class ShaderWindow(pyglet.window.Window):
             self.next_cursor()
         elif symbol in self.num_keys:
             self.angledelta = float(self.num_keys.index(symbol) + (self.angledelta % 1))
+            self.lastangledelta = self.angledelta
         elif symbol == pyglet.window.key.ESCAPE:
-            self.on_close()
+            # through the handler stack, so the latency report sees it
+            self.dispatch_event('on_close')
             
   
     def update(self, dt):
+        self.stepper.advance(dt)
+        
+    def step(self, dt):
+        self.lastangledelta = self.angledelta
         self.angledelta += self.angleinc * self.angledir
         if self.angledelta >= 100.0:
             self.angledelta = 100.0
@@ -169,12 +186,13 @@ class ShaderWindow(pyglet.window.Window):
             self.angledelta = 1.0
             self.angledir = -self.angledir
             
-        print self.angledelta
-            
-        self.angle = (2 * pi) / self.angledelta
-            
 
     def on_draw(self):
+        # draw in between the last two steps
+        alpha = self.stepper.alpha
+        angledelta = self.lastangledelta + (self.angledelta - self.lastangledelta) * alpha
+        self.angle = (2 * pi) / angledelta
+        
         glBindTexture(self.texture.target, self.texture.id)
         pyglet.gl.glClearColor(1.0, 0.0, 0.0, 1.0)
         self.clear()
@@ -184,7 +202,7 @@ class ShaderWindow(pyglet.window.Window):
         
         if self.shading:
             self.shader.bind()
-            shader.uniformf('angle', self.angle)
+            self.shader.uniformf('angle', self.angle)
         self.batch.draw()
         if self.shading:
             self.shader.unbind()
@@ -200,6 +218,12 @@ class ShaderWindow(pyglet.window.Window):
         
         # copy the result back into the texture
         self.copyFramebuffer(self.texture)
+        startup.first_frame()
+        
+        self.frametimes.tick()
+        self.metrics.value('angledelta', angledelta)
+        self.metrics.value('frame ms mean/std/max', self.frametimes.stats())
+        self.metrics.value('dropped s', self.stepper.dropped)
 
 # create our shader
 shader = NewShader(['''
@@ -231,6 +255,7 @@ void main() {
     gl_FragColor = vec4(newcolor, 1.0);
 }
 '''])
+startup.mark('import')
 
 
 def run():